@@ -4,10 +4,19 @@ API扩展模块
 添加新的API端点
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query
-from fastapi.responses import FileResponse, JSONResponse
+import asyncio
+import functools
+import hashlib
+import os
+import platform
+import sys
 from typing import Optional
-from pydantic import BaseModel
+
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, Response
+from pydantic import BaseModel, model_validator
 
 from core.logger import get_logger
 from core.database import db
@@ -15,13 +24,147 @@ from core.performance import performance_monitor
 from core.cache import cache
 from core.exporter import exporter
 from core.auth_api import get_current_user
-from core.config import get_config
+from core.config import config_manager, get_config
 
 logger = get_logger("api_extended")
 
 # 创建路由
 router = APIRouter(prefix="/api/v2", tags=["v2"])
 
+# 导出文件下载路径前缀（不参与响应压缩）
+_EXPORT_DOWNLOAD_PREFIX = router.prefix + "/export/download/"
+
+# 用户分析相关缓存键前缀，数据变更时按前缀失效
+ANALYTICS_CACHE_PREFIX = "analytics:"
+
+# 系统信息在进程生命周期内不变，导入时计算一次
+_SYSTEM_INFO_BYTES = orjson.dumps({
+    "success": True,
+    "data": {
+        "platform": platform.platform(),
+        "python_version": sys.version,
+        "architecture": platform.machine(),
+        "processor": platform.processor()
+    }
+})
+
+# 配置和系统信息接口的 HTTP 缓存策略
+_CONFIG_CACHE_CONTROL = "public, max-age=60"
+_SYSTEM_INFO_CACHE_CONTROL = "public, max-age=3600"
+
+# 配置接口的序列化结果: (配置版本, JSON字节, ETag)
+_config_response = (-1, b"", "")
+
+
+# ==================== 响应缓存 ====================
+
+def _cache_key(namespace: str, params: dict) -> str:
+    """根据命名空间和请求参数生成缓存键"""
+    digest = hashlib.sha256(orjson.dumps(params, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+def _etag(body: bytes) -> str:
+    """根据响应内容生成弱ETag"""
+    return f'W/"{hashlib.md5(body, usedforsecurity=False).hexdigest()}"'
+
+
+def _json_response(body: bytes, cache_status: str, etag: Optional[str] = None,
+                   request: Optional[Request] = None,
+                   cache_control: Optional[str] = None) -> Response:
+    """
+    用已序列化的JSON字节构造响应
+    
+    Args:
+        body: JSON字节
+        cache_status: 服务端缓存状态（HIT/MISS）
+        etag: ETag，提供时支持 If-None-Match 条件请求
+        request: 当前请求，用于读取 If-None-Match
+        cache_control: Cache-Control 响应头
+    """
+    headers = {"X-Cache": cache_status}
+    if cache_control is not None:
+        headers["Cache-Control"] = cache_control
+    if etag is not None:
+        headers["ETag"] = etag
+        if request is not None and request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+_SYSTEM_INFO_ETAG = _etag(_SYSTEM_INFO_BYTES)
+
+
+def cached_response(namespace: str, ttl: int, cache_control: Optional[str] = None):
+    """
+    端点响应缓存装饰器，缓存序列化后的JSON字节，命中时直接返回
+    
+    被装饰的端点可声明 request: Request 参数，以支持 If-None-Match 条件请求
+    
+    Args:
+        namespace: 缓存键命名空间
+        ttl: 缓存过期时间（秒）
+        cache_control: Cache-Control 响应头
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            request = kwargs.get("request")
+            params = {k: v for k, v in kwargs.items() if k != "request"}
+            key = _cache_key(namespace, params)
+            
+            found, cached_value = cache.try_get(key)
+            if found:
+                body, etag = cached_value
+                return _json_response(body, "HIT", etag, request, cache_control)
+            
+            payload = await func(**kwargs)
+            body = orjson.dumps(payload)
+            etag = _etag(body)
+            cache.set(key, (body, etag), ttl)
+            return _json_response(body, "MISS", etag, request, cache_control)
+        
+        return wrapper
+    
+    return decorator
+
+
+# ==================== 异常处理 ====================
+
+async def unhandled_exception_handler(request: Request, exc: Exception) -> Response:
+    """
+    未捕获异常的统一处理，需在应用上注册:
+    app.add_exception_handler(Exception, unhandled_exception_handler)
+    """
+    logger.error(f"{request.method} {request.url.path} 处理失败: {exc}", exc_info=exc)
+    return Response(
+        orjson.dumps({"success": False, "detail": str(exc)}),
+        status_code=500,
+        media_type="application/json"
+    )
+
+
+class V2GZipMiddleware(GZipMiddleware):
+    """
+    仅压缩 v2 API 的响应，跳过导出文件下载（二进制文件且需保留 Content-Length）
+    需在应用上注册: app.add_middleware(V2GZipMiddleware, minimum_size=1024, compresslevel=5)
+    """
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path.startswith(router.prefix) and not path.startswith(_EXPORT_DOWNLOAD_PREFIX):
+                await super().__call__(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class ExportFileResponse(FileResponse):
+    """导出文件下载响应，使用更大的分块减少大文件的读写次数"""
+    
+    chunk_size = 1024 * 1024
+
 
 # ==================== 数据模型 ====================
 
@@ -32,65 +175,54 @@ class ExportRequest(BaseModel):
     metric_name: Optional[str] = None
     hours: Optional[int] = 24
     limit: Optional[int] = 10000
+    
+    @model_validator(mode="after")
+    def check_metric_name(self):
+        """导出性能指标时必须指定metric_name"""
+        if self.data_type == "performance_metrics" and not self.metric_name:
+            raise ValueError("需要指定metric_name")
+        return self
 
 
 # ==================== 性能监控API ====================
 
 @router.get("/performance/metrics")
+@cached_response("performance:metrics", ttl=5)
 async def get_performance_metrics():
     """获取当前性能指标"""
-    try:
-        metrics = performance_monitor.get_current_metrics()
-        return JSONResponse(content={"success": True, "data": metrics})
-    except Exception as e:
-        logger.error(f"获取性能指标失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    metrics = performance_monitor.get_current_metrics()
+    return {"success": True, "data": metrics}
 
 
 @router.get("/performance/health")
 async def get_health_status():
     """获取系统健康状态"""
-    try:
-        health = performance_monitor.get_health_status()
-        return JSONResponse(content={"success": True, "data": health})
-    except Exception as e:
-        logger.error(f"获取健康状态失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    health = performance_monitor.get_health_status()
+    return {"success": True, "data": health}
 
 
 # ==================== 缓存管理API ====================
 
 @router.get("/cache/stats")
+@cached_response("cache:stats", ttl=5)
 async def get_cache_stats():
     """获取缓存统计信息"""
-    try:
-        stats = cache.get_stats()
-        return JSONResponse(content={"success": True, "data": stats})
-    except Exception as e:
-        logger.error(f"获取缓存统计失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    stats = cache.get_stats()
+    return {"success": True, "data": stats}
 
 
 @router.post("/cache/clear")
 async def clear_cache():
     """清空缓存"""
-    try:
-        cache.clear()
-        return JSONResponse(content={"success": True, "message": "缓存已清空"})
-    except Exception as e:
-        logger.error(f"清空缓存失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    cache.clear()
+    return {"success": True, "message": "缓存已清空"}
 
 
 @router.post("/cache/cleanup")
 async def cleanup_cache():
     """清理过期缓存"""
-    try:
-        cache.cleanup_expired()
-        return JSONResponse(content={"success": True, "message": "过期缓存已清理"})
-    except Exception as e:
-        logger.error(f"清理缓存失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    cache.cleanup_expired()
+    return {"success": True, "message": "过期缓存已清理"}
 
 
 # ==================== 数据库管理API ====================
@@ -98,191 +230,158 @@ async def cleanup_cache():
 @router.post("/database/backup")
 async def backup_database():
     """备份数据库"""
-    try:
-        success = db.backup()
-        if success:
-            return JSONResponse(content={"success": True, "message": "数据库备份成功"})
-        else:
-            raise HTTPException(status_code=500, detail="数据库备份失败")
-    except Exception as e:
-        logger.error(f"数据库备份失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    success = await asyncio.to_thread(db.backup)
+    if success:
+        cache.delete_prefix(ANALYTICS_CACHE_PREFIX)
+        return {"success": True, "message": "数据库备份成功"}
+    else:
+        raise HTTPException(status_code=500, detail="数据库备份失败")
 
 
 @router.post("/database/cleanup")
 async def cleanup_database(days: int = Query(30, ge=1, le=365)):
     """清理旧数据"""
-    try:
-        db.clean_old_data(days)
-        return JSONResponse(content={
-            "success": True,
-            "message": f"已清理{days}天前的旧数据"
-        })
-    except Exception as e:
-        logger.error(f"清理数据失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    await asyncio.to_thread(db.clean_old_data, days)
+    cache.delete_prefix(ANALYTICS_CACHE_PREFIX)
+    return {
+        "success": True,
+        "message": f"已清理{days}天前的旧数据"
+    }
 
 
 # ==================== 数据导出API ====================
 
+_EXPORT_DIR = str(exporter.export_dir)
+
+
+def _export_path(filename: str) -> str:
+    """校验文件名并返回导出文件路径，拒绝路径穿越"""
+    if "/" in filename or "\\" in filename or ".." in filename:
+        raise HTTPException(status_code=400, detail="非法的文件名")
+    return os.path.join(_EXPORT_DIR, filename)
+
+
+# data_type -> 导出函数，导入时构建
+_EXPORTERS = {
+    "user_analytics": lambda r: exporter.export_user_analytics(r.format),
+    "danmaku_records": lambda r: exporter.export_danmaku_records(r.room_id, r.limit, r.format),
+    "performance_metrics": lambda r: exporter.export_performance_metrics(
+        r.metric_name, r.hours, r.format
+    ),
+    "error_logs": lambda r: exporter.export_error_logs(r.limit, r.format),
+}
+
+
 @router.post("/export")
 async def export_data(request: ExportRequest):
     """导出数据"""
-    try:
-        if request.data_type == "user_analytics":
-            filepath = exporter.export_user_analytics(request.format)
-        
-        elif request.data_type == "danmaku_records":
-            filepath = exporter.export_danmaku_records(
-                request.room_id,
-                request.limit,
-                request.format
-            )
-        
-        elif request.data_type == "performance_metrics":
-            if not request.metric_name:
-                raise HTTPException(status_code=400, detail="需要指定metric_name")
-            
-            filepath = exporter.export_performance_metrics(
-                request.metric_name,
-                request.hours,
-                request.format
-            )
-        
-        elif request.data_type == "error_logs":
-            filepath = exporter.export_error_logs(request.limit, request.format)
-        
-        else:
-            raise HTTPException(status_code=400, detail=f"不支持的数据类型: {request.data_type}")
-        
-        return JSONResponse(content={
-            "success": True,
-            "filepath": filepath,
-            "message": "数据导出成功"
-        })
+    export_func = _EXPORTERS.get(request.data_type)
+    if export_func is None:
+        raise HTTPException(status_code=400, detail=f"不支持的数据类型: {request.data_type}")
+    
+    filepath = await asyncio.to_thread(export_func, request)
     
-    except Exception as e:
-        logger.error(f"数据导出失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "success": True,
+        "filepath": filepath,
+        "message": "数据导出成功"
+    }
 
 
 @router.get("/export/list")
 async def list_exports():
     """获取导出文件列表"""
-    try:
-        files = exporter.get_export_list()
-        return JSONResponse(content={"success": True, "data": files})
-    except Exception as e:
-        logger.error(f"获取导出列表失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    files = await asyncio.to_thread(exporter.get_export_list)
+    return {"success": True, "data": files}
 
 
 @router.get("/export/download/{filename}")
 async def download_export(filename: str):
     """下载导出文件"""
+    filepath = _export_path(filename)
+    
     try:
-        filepath = exporter.export_dir / filename
-        
-        if not filepath.exists():
-            raise HTTPException(status_code=404, detail="文件不存在")
-        
-        return FileResponse(
-            path=filepath,
-            filename=filename,
-            media_type='application/octet-stream'
-        )
-    except Exception as e:
-        logger.error(f"下载文件失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        stat_result = os.stat(filepath)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    
+    # 传入 stat 结果，直接带上 Content-Length 且不再重复 stat
+    return ExportFileResponse(
+        path=filepath,
+        filename=filename,
+        media_type='application/octet-stream',
+        stat_result=stat_result
+    )
 
 
 @router.delete("/export/{filename}")
 async def delete_export(filename: str):
     """删除导出文件"""
-    try:
-        success = exporter.delete_export(filename)
-        
-        if success:
-            return JSONResponse(content={"success": True, "message": "文件已删除"})
-        else:
-            raise HTTPException(status_code=404, detail="文件不存在")
+    _export_path(filename)  # 仅校验文件名
+    success = await asyncio.to_thread(exporter.delete_export, filename)
     
-    except Exception as e:
-        logger.error(f"删除文件失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    if success:
+        return {"success": True, "message": "文件已删除"}
+    else:
+        raise HTTPException(status_code=404, detail="文件不存在")
 
 
 # ==================== 用户分析API ====================
 
 @router.get("/analytics/users")
-async def get_all_users(limit: int = Query(100, ge=1, le=1000)):
+@cached_response(ANALYTICS_CACHE_PREFIX + "users", ttl=30)
+async def get_all_users(request: Request, limit: int = Query(100, ge=1, le=1000)):
     """获取所有用户分析数据"""
-    try:
-        users = db.get_all_users_analytics(limit)
-        return JSONResponse(content={"success": True, "data": users})
-    except Exception as e:
-        logger.error(f"获取用户数据失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    users = await asyncio.to_thread(db.get_all_users_analytics, limit)
+    return {"success": True, "data": users}
 
 
 @router.get("/analytics/user/{user_name}")
-async def get_user_detail(user_name: str):
+@cached_response(ANALYTICS_CACHE_PREFIX + "user", ttl=30)
+async def get_user_detail(request: Request, user_name: str):
     """获取用户详细信息"""
-    try:
-        user = db.get_user_analytics(user_name)
-        
-        if user:
-            return JSONResponse(content={"success": True, "data": user})
-        else:
-            raise HTTPException(status_code=404, detail="用户不存在")
+    user = await asyncio.to_thread(db.get_user_analytics, user_name)
     
-    except Exception as e:
-        logger.error(f"获取用户详情失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    if user:
+        return {"success": True, "data": user}
+    else:
+        raise HTTPException(status_code=404, detail="用户不存在")
 
 
 # ==================== 配置管理API ====================
 
 @router.get("/config")
-async def get_config_api():
-    """获取配置"""
-    try:
-        # 只返回非敏感配置
-        safe_config = {
-            "server": get_config("server"),
-            "reconnect": get_config("reconnect"),
-            "performance": get_config("performance"),
-            "monitoring": get_config("monitoring"),
-            "database": {
-                "type": get_config("database.type"),
-                "backup_enabled": get_config("database.backup_enabled"),
-                "backup_interval_hours": get_config("database.backup_interval_hours")
-            }
+async def get_config_api(request: Request):
+    """获取配置（按配置版本缓存序列化结果）"""
+    global _config_response
+    version, body, etag = _config_response
+    if version == config_manager.version:
+        return _json_response(body, "HIT", etag, request, _CONFIG_CACHE_CONTROL)
+    
+    # 只返回非敏感配置
+    safe_config = {
+        "server": get_config("server"),
+        "reconnect": get_config("reconnect"),
+        "performance": get_config("performance"),
+        "monitoring": get_config("monitoring"),
+        "database": {
+            "type": get_config("database.type"),
+            "backup_enabled": get_config("database.backup_enabled"),
+            "backup_interval_hours": get_config("database.backup_interval_hours")
         }
-        
-        return JSONResponse(content={"success": True, "data": safe_config})
-    except Exception as e:
-        logger.error(f"获取配置失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    }
+    
+    body = orjson.dumps({"success": True, "data": safe_config})
+    etag = _etag(body)
+    _config_response = (config_manager.version, body, etag)
+    return _json_response(body, "MISS", etag, request, _CONFIG_CACHE_CONTROL)
 
 
 # ==================== 系统信息API ====================
 
 @router.get("/system/info")
-async def get_system_info():
+async def get_system_info(request: Request):
     """获取系统信息"""
-    try:
-        import platform
-        import sys
-        
-        info = {
-            "platform": platform.platform(),
-            "python_version": sys.version,
-            "architecture": platform.machine(),
-            "processor": platform.processor()
-        }
-        
-        return JSONResponse(content={"success": True, "data": info})
-    except Exception as e:
-        logger.error(f"获取系统信息失败: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    return _json_response(
+        _SYSTEM_INFO_BYTES, "HIT", _SYSTEM_INFO_ETAG, request, _SYSTEM_INFO_CACHE_CONTROL
+    )
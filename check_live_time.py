@@ -9,23 +9,28 @@ import httpx
 import json
 import time
 
+from core.danmaku import install_uvloop
+
+ROOM_ID = 1837226318
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Referer": f"https://live.bilibili.com/{ROOM_ID}"
+}
+
 async def check_live_time():
     """检查直播时间的不同字段"""
     print("检查直播时间字段")
     print("=" * 50)
     
-    room_id = 1837226318
+    room_id = ROOM_ID
     
-    async with httpx.AsyncClient(timeout=10.0) as client:
+    async with httpx.AsyncClient(timeout=10.0, headers=HEADERS) as client:
         # 获取房间信息
         url = "https://api.live.bilibili.com/room/v1/Room/get_info"
         params = {"room_id": room_id}
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Referer": f"https://live.bilibili.com/{room_id}"
-        }
         
-        response = await client.get(url, params=params, headers=headers)
+        response = await client.get(url, params=params)
         
         if response.status_code == 200:
             data = response.json()
@@ -71,10 +76,11 @@ async def check_live_time():
                 detail_url = "https://api.live.bilibili.com/xlive/web-room/v1/index/getInfoByRoom"
                 detail_params = {"room_id": room_id}
                 
-                detail_response = await client.get(detail_url, params=detail_params, headers=headers)
+                detail_response = await client.get(detail_url, params=detail_params)
                 if detail_response.status_code == 200:
                     detail_data = detail_response.json()
                     print(f"详情API响应: {json.dumps(detail_data, ensure_ascii=False)[:500]}...")
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(check_live_time())
\ No newline at end of file
@@ -5,22 +5,111 @@ B站认证模块
 """
 
 import os
-import json
+import asyncio
 import time
 import base64
 import hashlib
-from typing import Dict, Optional
+import platform
+import uuid
+import functools
+from typing import Dict, Optional, Tuple
 from pathlib import Path
 
 import httpx
+import orjson
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+from core.logger import get_logger
+
+logger = get_logger("auth")
+
+
+# 机器特征在进程生命周期内不变，导入时计算一次
+_MACHINE_ID = str(uuid.getnode())  # 获取机器MAC地址
+_PLATFORM_INFO = platform.system() + platform.machine()
+
+# B站接口通用请求头
+_DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Referer": "https://www.bilibili.com/",
+}
+
+# AES-GCM 随机数长度（字节），写在密文之前
+_NONCE_SIZE = 12
+
+
+@functools.lru_cache(maxsize=4)
+def _derive_key(password: bytes, salt: bytes) -> bytes:
+    """
+    派生加密密钥（PBKDF2 开销较大，按密码和盐值缓存）
+    
+    Args:
+        password: 密码
+        salt: 盐值
+        
+    Returns:
+        bytes: 32 字节密钥
+    """
+    # 使用 PBKDF2 派生密钥，增加迭代次数以提高安全性
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=200000,  # 增加到200,000次迭代
+    )
+    return kdf.derive(password)
+
+
+@functools.lru_cache(maxsize=64)
+def _render_qrcode_image(url: str) -> str:
+    """
+    渲染二维码图片（Base64），同一 URL 的结果是确定的，因此缓存
+    
+    Args:
+        url: 二维码内容
+        
+    Returns:
+        str: Base64 编码的图片
+    """
+    try:
+        import qrcode
+        from io import BytesIO
+        
+        # 生成二维码
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
+        )
+        qr.add_data(url)
+        qr.make(fit=True)
+        
+        img = qr.make_image(fill_color="black", back_color="white")
+        
+        # 转换为 Base64
+        buffer = BytesIO()
+        img.save(buffer, format='PNG')
+        img_base64 = base64.b64encode(buffer.getvalue()).decode()
+        
+        return f"data:image/png;base64,{img_base64}"
+    except ImportError:
+        # 如果没有安装 qrcode 库，返回一个占位符
+        return ""
+
 
 class BilibiliAuth:
     """B站认证管理器"""
     
+    __slots__ = (
+        "data_dir", "credential_file", "cookies", "is_anonymous",
+        "user_info", "cipher", "_client"
+    )
+    
     # B站登录相关 API
     QRCODE_GET_URL = "https://passport.bilibili.com/x/passport-login/web/qrcode/generate"
     QRCODE_POLL_URL = "https://passport.bilibili.com/x/passport-login/web/qrcode/poll"
@@ -43,44 +132,75 @@ class BilibiliAuth:
         # 初始化加密器
         self.cipher = self._init_cipher()
         
+        # 共享的 HTTP 客户端（延迟创建，复用连接池）
+        self._client: Optional[httpx.AsyncClient] = None
+        
         # 尝试加载已保存的凭证
         self.load_credential()
     
-    def _init_cipher(self) -> Fernet:
+    def _key_material(self) -> Tuple[bytes, bytes]:
         """
-        初始化加密器（使用 PBKDF2 + Fernet）
+        获取密钥派生所需的密码和盐值
         
         Returns:
-            Fernet: 加密器实例
+            Tuple[bytes, bytes]: (密码, 盐值)
         """
         # 优先从环境变量获取密钥，否则使用基于机器特征的密钥
-        import os
-        import uuid
-        import platform
-        
         password = os.environ.get('BILILIVE_ENCRYPTION_KEY', '').encode()
         if not password:
             # 生成基于机器特征的密钥
-            machine_id = str(uuid.getnode())  # 获取机器MAC地址
-            platform_info = platform.system() + platform.machine()
-            password = (machine_id + platform_info + "BililiveRobot_2026").encode()
+            password = (_MACHINE_ID + _PLATFORM_INFO + "BililiveRobot_2026").encode()
         
         # 生成随机盐值（基于机器特征）
         salt = os.environ.get('BILILIVE_ENCRYPTION_SALT', '').encode()
         if not salt:
-            import hashlib
-            salt = hashlib.sha256(str(uuid.getnode()).encode()).digest()[:16]
+            salt = hashlib.sha256(_MACHINE_ID.encode()).digest()[:16]
         
-        # 使用 PBKDF2 派生密钥，增加迭代次数以提高安全性
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=200000,  # 增加到200,000次迭代
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password))
+        return password, salt
+    
+    def _init_cipher(self) -> AESGCM:
+        """
+        初始化加密器（使用 PBKDF2 + AES-GCM）
+        
+        Returns:
+            AESGCM: 加密器实例
+        """
+        return AESGCM(_derive_key(*self._key_material()))
+    
+    def _decrypt_legacy(self, encrypted_data: bytes) -> bytes:
+        """
+        解密旧版 Fernet 格式的凭证
+        
+        Args:
+            encrypted_data: Fernet 令牌
+            
+        Returns:
+            bytes: 明文
+        """
+        key = base64.urlsafe_b64encode(_derive_key(*self._key_material()))
+        return Fernet(key).decrypt(encrypted_data)
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        """
+        获取共享的 HTTP 客户端
         
-        return Fernet(key)
+        Returns:
+            httpx.AsyncClient: 客户端实例
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=10.0,
+                headers=_DEFAULT_HEADERS,
+                limits=httpx.Limits(max_keepalive_connections=10)
+            )
+        return self._client
+    
+    async def close(self):
+        """关闭共享的 HTTP 客户端"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     async def generate_qrcode(self) -> Dict:
         """
@@ -95,62 +215,56 @@ class BilibiliAuth:
             }
         """
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Referer": "https://www.bilibili.com/",
-            }
-
-            async with httpx.AsyncClient() as client:
-                response = await client.get(self.QRCODE_GET_URL, headers=headers)
-
-                # 检查 HTTP 状态码
-                if response.status_code != 200:
-                    return {
-                        "success": False,
-                        "message": f"HTTP 错误: {response.status_code}"
-                    }
-
-                # 检查响应内容
-                text = response.text
-                if not text or len(text) < 10:
-                    return {
-                        "success": False,
-                        "message": "响应内容为空"
-                    }
-
-                # 尝试解析 JSON
-                try:
-                    data = response.json()
-                except Exception as json_error:
-                    # 如果 JSON 解析失败，记录实际响应内容
-                    print(f"JSON 解析失败，响应内容: {text[:200]}")
-                    return {
-                        "success": False,
-                        "message": f"JSON 解析错误: {str(json_error)}"
-                    }
-
-                if data.get("code") == 0:
-                    qrcode_data = data["data"]
-                    qrcode_url = qrcode_data["url"]
-                    qrcode_key = qrcode_data["qrcode_key"]
-
-                    # 生成二维码图片（Base64）
-                    qrcode_image = await self._generate_qrcode_image(qrcode_url)
-
-                    return {
-                        "success": True,
-                        "qrcode_key": qrcode_key,
-                        "qrcode_url": qrcode_url,
-                        "qrcode_image": qrcode_image
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "message": data.get("message", "生成二维码失败")
-                    }
+            client = await self._get_client()
+            response = await client.get(self.QRCODE_GET_URL)
+
+            # 检查 HTTP 状态码
+            if response.status_code != 200:
+                return {
+                    "success": False,
+                    "message": f"HTTP 错误: {response.status_code}"
+                }
+
+            # 检查响应内容
+            text = response.text
+            if not text or len(text) < 10:
+                return {
+                    "success": False,
+                    "message": "响应内容为空"
+                }
+
+            # 尝试解析 JSON
+            try:
+                data = response.json()
+            except Exception as json_error:
+                # 如果 JSON 解析失败，记录实际响应内容
+                logger.warning(f"JSON 解析失败，响应内容: {text[:200]}")
+                return {
+                    "success": False,
+                    "message": f"JSON 解析错误: {str(json_error)}"
+                }
+
+            if data.get("code") == 0:
+                qrcode_data = data["data"]
+                qrcode_url = qrcode_data["url"]
+                qrcode_key = qrcode_data["qrcode_key"]
+
+                # 生成二维码图片（Base64）
+                qrcode_image = await self._generate_qrcode_image(qrcode_url)
+
+                return {
+                    "success": True,
+                    "qrcode_key": qrcode_key,
+                    "qrcode_url": qrcode_url,
+                    "qrcode_image": qrcode_image
+                }
+            else:
+                return {
+                    "success": False,
+                    "message": data.get("message", "生成二维码失败")
+                }
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("生成二维码失败")
             return {
                 "success": False,
                 "message": f"网络错误: {str(e)}"
@@ -158,7 +272,7 @@ class BilibiliAuth:
     
     async def _generate_qrcode_image(self, url: str) -> str:
         """
-        生成二维码图片（Base64）
+        生成二维码图片（Base64），编码在线程中执行，避免阻塞事件循环
         
         Args:
             url: 二维码内容
@@ -166,31 +280,7 @@ class BilibiliAuth:
         Returns:
             str: Base64 编码的图片
         """
-        try:
-            import qrcode
-            from io import BytesIO
-            
-            # 生成二维码
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(url)
-            qr.make(fit=True)
-            
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # 转换为 Base64
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            img_base64 = base64.b64encode(buffer.getvalue()).decode()
-            
-            return f"data:image/png;base64,{img_base64}"
-        except ImportError:
-            # 如果没有安装 qrcode 库，返回一个占位符
-            return ""
+        return await asyncio.to_thread(_render_qrcode_image, url)
     
     async def poll_qrcode_status(self, qrcode_key: str) -> Dict:
         """
@@ -208,101 +298,93 @@ class BilibiliAuth:
             }
         """
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Referer": "https://www.bilibili.com/",
-            }
+            client = await self._get_client()
+            response = await client.get(
+                self.QRCODE_POLL_URL,
+                params={"qrcode_key": qrcode_key}
+            )
 
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    self.QRCODE_POLL_URL,
-                    params={"qrcode_key": qrcode_key},
-                    headers=headers
-                )
+            # 检查 HTTP 状态码
+            if response.status_code != 200:
+                return {
+                    "success": False,
+                    "status": "error",
+                    "message": f"HTTP 错误: {response.status_code}"
+                }
 
-                # 检查 HTTP 状态码
-                if response.status_code != 200:
-                    return {
-                        "success": False,
-                        "status": "error",
-                        "message": f"HTTP 错误: {response.status_code}"
-                    }
-
-                # 尝试解析 JSON
-                try:
-                    data = response.json()
-                except Exception as json_error:
-                    print(f"JSON 解析失败，响应内容: {response.text[:200]}")
-                    return {
-                        "success": False,
-                        "status": "error",
-                        "message": f"JSON 解析错误: {str(json_error)}"
-                    }
-
-                code = data.get("data", {}).get("code")
-
-                # 86101: 未扫描
-                # 86090: 已扫描未确认
-                # 0: 已确认
-                # 86038: 二维码已失效
-
-                if code == 86101:
-                    return {
-                        "success": True,
-                        "status": "pending",
-                        "message": "等待扫描"
-                    }
-                elif code == 86090:
-                    return {
-                        "success": True,
-                        "status": "scanned",
-                        "message": "已扫描，等待确认"
-                    }
-                elif code == 0:
-                    # 登录成功，提取 Cookie
-                    cookies_dict = {}
-                    for cookie in response.cookies.jar:
-                        cookies_dict[cookie.name] = cookie.value
-
-                    # 获取用户信息
-                    refresh_token = data.get("data", {}).get("refresh_token", "")
-
-                    self.cookies = cookies_dict
-                    self.is_anonymous = False
-
-                    # 获取用户信息
-                    await self._fetch_user_info()
-
-                    # 设置当前用户信息到用户管理器
-                    if self.user_info:
-                        from core.user_manager import user_manager
-                        user_id = self.user_info.get("mid") or self.user_info.get("uid")
-                        user_name = self.user_info.get("uname")
-                        if user_id and user_name:
-                            user_manager.set_current_user(user_id, user_name)
-
-                    # 保存凭证（在获取用户信息之后）
-                    self.save_credential()
-
-                    return {
-                        "success": True,
-                        "status": "confirmed",
-                        "message": "登录成功",
-                        "cookies": cookies_dict,
-                        "user_info": self.user_info
-                    }
-                elif code == 86038:
-                    return {
-                        "success": False,
-                        "status": "expired",
-                        "message": "二维码已过期"
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "status": "error",
-                        "message": f"未知状态码: {code}"
-                    }
+            # 尝试解析 JSON
+            try:
+                data = response.json()
+            except Exception as json_error:
+                logger.warning(f"JSON 解析失败，响应内容: {response.text[:200]}")
+                return {
+                    "success": False,
+                    "status": "error",
+                    "message": f"JSON 解析错误: {str(json_error)}"
+                }
+
+            code = data.get("data", {}).get("code")
+
+            # 86101: 未扫描
+            # 86090: 已扫描未确认
+            # 0: 已确认
+            # 86038: 二维码已失效
+
+            if code == 86101:
+                return {
+                    "success": True,
+                    "status": "pending",
+                    "message": "等待扫描"
+                }
+            elif code == 86090:
+                return {
+                    "success": True,
+                    "status": "scanned",
+                    "message": "已扫描，等待确认"
+                }
+            elif code == 0:
+                # 登录成功，提取 Cookie（遍历 jar，同名 Cookie 以后出现的为准）
+                cookies_dict = {cookie.name: cookie.value for cookie in response.cookies.jar}
+
+                # 获取用户信息
+                refresh_token = data.get("data", {}).get("refresh_token", "")
+
+                self.cookies = cookies_dict
+                self.is_anonymous = False
+
+                # 获取用户信息
+                await self._fetch_user_info()
+
+                # 设置当前用户信息到用户管理器
+                if self.user_info:
+                    from core.user_manager import user_manager
+                    user_id = self.user_info.get("mid") or self.user_info.get("uid")
+                    user_name = self.user_info.get("uname")
+                    if user_id and user_name:
+                        user_manager.set_current_user(user_id, user_name)
+
+                # 保存凭证（在获取用户信息之后），加密和写文件放到线程中执行
+                await self.save_credential_async()
+
+                return {
+                    "success": True,
+                    "status": "confirmed",
+                    "message": "登录成功",
+                    "cookies": cookies_dict,
+                    "user_info": self.user_info
+                }
+            elif code == 86038:
+                return {
+                    "success": False,
+                    "status": "expired",
+                    "message": "二维码已过期"
+                }
+            else:
+                return {
+                    "success": False,
+                    "status": "error",
+                    "message": f"未知状态码: {code}"
+                }
         except Exception as e:
             return {
                 "success": False,
@@ -313,49 +395,45 @@ class BilibiliAuth:
     async def _fetch_user_info(self):
         """获取用户信息"""
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Referer": "https://www.bilibili.com/",
-            }
-
-            async with httpx.AsyncClient(cookies=self.cookies) as client:
-                response = await client.get(
-                    "https://api.bilibili.com/x/web-interface/nav",
-                    headers=headers
-                )
-
-                # 检查 HTTP 状态码
-                if response.status_code != 200:
-                    print(f"获取用户信息失败: HTTP {response.status_code}")
-                    return
-
-                # 检查响应内容
-                if not response.text or len(response.text) < 10:
-                    print("获取用户信息失败: 响应内容为空")
-                    return
-
-                # 尝试解析 JSON
-                try:
-                    data = response.json()
-                except Exception as json_error:
-                    print(f"获取用户信息失败: JSON 解析错误 - {json_error}")
-                    print(f"响应内容: {response.text[:200]}")
-                    return
-
-                if data.get("code") == 0:
-                    user_data = data["data"]
-                    self.user_info = {
-                        "uid": user_data.get("mid"),
-                        "uname": user_data.get("uname"),
-                        "face": user_data.get("face"),
-                        "level": user_data.get("level_info", {}).get("current_level", 0),
-                        "vip_type": user_data.get("vipType", 0),
-                        "login_time": int(time.time())
-                    }
-                else:
-                    print(f"获取用户信息失败: {data.get('message', '未知错误')}")
+            client = await self._get_client()
+            # 把登录凭证显式写入共享客户端的 Cookie jar，
+            # 先清空扫码轮询响应留下的 Cookie，避免同名 Cookie 重复发送
+            client.cookies.clear()
+            client.cookies.update(self.cookies)
+            response = await client.get("https://api.bilibili.com/x/web-interface/nav")
+
+            # 检查 HTTP 状态码
+            if response.status_code != 200:
+                logger.warning(f"获取用户信息失败: HTTP {response.status_code}")
+                return
+
+            # 检查响应内容
+            if not response.text or len(response.text) < 10:
+                logger.warning("获取用户信息失败: 响应内容为空")
+                return
+
+            # 尝试解析 JSON
+            try:
+                data = response.json()
+            except Exception as json_error:
+                logger.warning(f"获取用户信息失败: JSON 解析错误 - {json_error}, "
+                               f"响应内容: {response.text[:200]}")
+                return
+
+            if data.get("code") == 0:
+                user_data = data["data"]
+                self.user_info = {
+                    "uid": user_data.get("mid"),
+                    "uname": user_data.get("uname"),
+                    "face": user_data.get("face"),
+                    "level": user_data.get("level_info", {}).get("current_level", 0),
+                    "vip_type": user_data.get("vipType", 0),
+                    "login_time": int(time.time())
+                }
+            else:
+                logger.warning(f"获取用户信息失败: {data.get('message', '未知错误')}")
         except Exception as e:
-            print(f"获取用户信息失败: {e}")
+            logger.error(f"获取用户信息失败: {e}")
     
     def save_credential(self):
         """保存登录凭证（加密存储）"""
@@ -367,11 +445,12 @@ class BilibiliAuth:
                 "save_time": int(time.time())
             }
             
-            # 序列化为 JSON
-            json_data = json.dumps(credential_data, ensure_ascii=False)
+            # 序列化为 JSON（直接得到 UTF-8 字节）
+            json_data = orjson.dumps(credential_data)
             
-            # 加密
-            encrypted_data = self.cipher.encrypt(json_data.encode())
+            # 加密（随机数 + 密文）
+            nonce = os.urandom(_NONCE_SIZE)
+            encrypted_data = nonce + self.cipher.encrypt(nonce, json_data, None)
             
             # 保存到文件
             with open(self.credential_file, "wb") as f:
@@ -384,12 +463,16 @@ class BilibiliAuth:
             except:
                 pass  # 在某些系统上可能无法设置权限
             
-            print("凭证保存成功")
+            logger.debug("凭证保存成功")
             return True
         except Exception as e:
-            print(f"保存凭证失败: {e}")
+            logger.error(f"保存凭证失败: {e}")
             return False
     
+    async def save_credential_async(self) -> bool:
+        """异步保存登录凭证，避免加密和磁盘写入阻塞事件循环"""
+        return await asyncio.to_thread(self.save_credential)
+    
     def load_credential(self) -> bool:
         """
         加载登录凭证（解密）
@@ -406,40 +489,56 @@ class BilibiliAuth:
                 encrypted_data = f.read()
             
             # 解密
-            decrypted_data = self.cipher.decrypt(encrypted_data)
+            try:
+                decrypted_data = self.cipher.decrypt(
+                    encrypted_data[:_NONCE_SIZE], encrypted_data[_NONCE_SIZE:], None
+                )
+            except InvalidTag:
+                # 兼容旧版 Fernet 格式的凭证文件，下次保存时自动迁移
+                decrypted_data = self._decrypt_legacy(encrypted_data)
             
             # 解析 JSON
-            credential_data = json.loads(decrypted_data.decode())
+            credential_data = orjson.loads(decrypted_data)
             
             self.cookies = credential_data.get("cookies", {})
             self.user_info = credential_data.get("user_info", {})
             self.is_anonymous = credential_data.get("is_anonymous", False)
             
-            print("凭证加载成功")
+            logger.debug("凭证加载成功")
             return True
         except Exception as e:
-            print(f"加载凭证失败: {e}")
+            logger.warning(f"加载凭证失败: {e}")
             return False
     
+    async def load_credential_async(self) -> bool:
+        """异步加载登录凭证，避免磁盘读取和解密阻塞事件循环"""
+        return await asyncio.to_thread(self.load_credential)
+    
     def set_anonymous(self):
         """切换到匿名模式"""
         self.is_anonymous = True
         self.cookies = {}
+        if self._client is not None:
+            self._client.cookies.clear()
         self.user_info = {}
         self.save_credential()
-        print("已切换到匿名模式")
+        logger.info("已切换到匿名模式")
     
     def logout(self):
         """退出登录"""
         self.cookies = {}
+        if self._client is not None:
+            self._client.cookies.clear()
         self.user_info = {}
         self.is_anonymous = False
         
         # 删除凭证文件
-        if self.credential_file.exists():
+        try:
             self.credential_file.unlink()
+        except FileNotFoundError:
+            pass
         
-        print("已退出登录")
+        logger.info("已退出登录")
     
     def is_logged_in(self) -> bool:
         """
@@ -5,9 +5,15 @@ API认证模块
 """
 
 import jwt
+import hmac
+import time
+import base64
+import hashlib
 import secrets
-from datetime import datetime, timedelta
+import functools
 from typing import Optional, Dict
+
+import orjson
 from fastapi import HTTPException, Security, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
@@ -19,12 +25,28 @@ logger = get_logger("auth_api")
 # HTTP Bearer认证
 security = HTTPBearer()
 
+# 已验证令牌的缓存容量
+TOKEN_CACHE_SIZE = 512
+
+# 令牌认证失败时返回的响应头
+_AUTH_HEADERS = {"WWW-Authenticate": "Bearer"}
+
+
+def _b64url(data: bytes) -> bytes:
+    """JWT 使用的无填充 base64url 编码"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
 
 class APIAuth:
     """API认证管理器"""
     
     _instance = None
     
+    JWT_ALGORITHM = 'HS256'
+    _ALGORITHMS = (JWT_ALGORITHM,)
+    # 必需的声明，由 PyJWT 在解码时统一校验
+    _DECODE_OPTIONS = {"require": ["exp", "iat", "user_id"], "verify_exp": True}
+    
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
@@ -38,8 +60,22 @@ class APIAuth:
                 self.jwt_secret = secrets.token_urlsafe(32)
                 config_manager.set('security.jwt_secret', self.jwt_secret)
             
-            self.jwt_algorithm = 'HS256'
+            self.jwt_algorithm = self.JWT_ALGORITHM
             self.jwt_expire_hours = config_manager.get('security.jwt_expire_hours', 24)
+            
+            # HS256 签名所需的固定头部和密钥字节，预先编码
+            self._header_b64 = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+            self._key_bytes = self.jwt_secret.encode()
+            # 已载入密钥的 HMAC 模板，签名时复制，省去每次的密钥填充计算
+            self._hmac_template = hmac.new(self._key_bytes, b'', hashlib.sha256)
+            
+            # 按令牌缓存解码结果，过期时间单独检查，避免重复解码和验签
+            self._decode = functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)(self._decode_token)
+            
+            # 有效API密钥的SHA256摘要集合及其对应的配置版本，配置变更后重新构建
+            # 比较的是完整摘要而非密钥本身，不会按字节泄露匹配进度
+            self._api_key_hash_set: frozenset = frozenset()
+            self._api_key_version = -1
             self.initialized = True
     
     def generate_token(self, user_id: str, extra_data: Optional[Dict] = None) -> str:
@@ -53,20 +89,54 @@ class APIAuth:
         Returns:
             JWT令牌字符串
         """
+        now = int(time.time())
         payload = {
             'user_id': user_id,
-            'exp': datetime.utcnow() + timedelta(hours=self.jwt_expire_hours),
-            'iat': datetime.utcnow()
+            'exp': now + self.jwt_expire_hours * 3600,
+            'iat': now
         }
         
         if extra_data:
             payload.update(extra_data)
         
-        token = jwt.encode(payload, self.jwt_secret, algorithm=self.jwt_algorithm)
+        token = self._sign_hs256(payload)
         logger.info(f"生成令牌: user_id={user_id}")
         
         return token
     
+    def _sign_hs256(self, payload: Dict) -> str:
+        """
+        使用 HS256 签发令牌（验证仍由 PyJWT 完成）
+        
+        Args:
+            payload: 令牌载荷
+            
+        Returns:
+            JWT令牌字符串
+        """
+        signing_input = self._header_b64 + b"." + _b64url(orjson.dumps(payload))
+        h = self._hmac_template.copy()
+        h.update(signing_input)
+        signature = h.digest()
+        return (signing_input + b"." + _b64url(signature)).decode()
+    
+    def _decode_token(self, token: str) -> Dict:
+        """
+        解码并验证JWT令牌（结果由 lru_cache 按令牌缓存）
+        
+        Args:
+            token: JWT令牌字符串
+            
+        Returns:
+            解码后的payload
+        """
+        return jwt.decode(
+            token,
+            self.jwt_secret,
+            algorithms=self._ALGORITHMS,
+            options=self._DECODE_OPTIONS
+        )
+    
     def verify_token(self, token: str) -> Dict:
         """
         验证JWT令牌
@@ -81,25 +151,25 @@ class APIAuth:
             HTTPException: 令牌无效或过期
         """
         try:
-            payload = jwt.decode(
-                token,
-                self.jwt_secret,
-                algorithms=[self.jwt_algorithm]
-            )
+            # 缓存中的 payload 为各次调用共享，返回副本以免调用方修改污染缓存
+            payload = dict(self._decode(token))
+            exp = payload.get('exp')
+            if exp is not None and exp <= time.time():
+                raise jwt.ExpiredSignatureError("Signature has expired")
             return payload
         except jwt.ExpiredSignatureError:
             logger.warning("令牌已过期")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="令牌已过期",
-                headers={"WWW-Authenticate": "Bearer"}
+                headers=_AUTH_HEADERS
             )
         except jwt.InvalidTokenError as e:
             logger.warning(f"无效的令牌: {e}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="无效的令牌",
-                headers={"WWW-Authenticate": "Bearer"}
+                headers=_AUTH_HEADERS
             )
     
     def get_current_user(self, 
@@ -139,9 +209,14 @@ class APIAuth:
             是否有效
         """
         # 这里可以从数据库或配置中验证API密钥
-        # 简单实现：从配置中获取有效的API密钥列表
-        valid_keys = config_manager.get('security.api_keys', [])
-        return api_key in valid_keys
+        # 简单实现：从配置中获取有效的API密钥，按配置版本缓存摘要集合
+        if self._api_key_version != config_manager.version:
+            self._api_key_hash_set = frozenset(
+                hashlib.sha256(key.encode()).digest()
+                for key in config_manager.get('security.api_keys', [])
+            )
+            self._api_key_version = config_manager.version
+        return hashlib.sha256(api_key.encode()).digest() in self._api_key_hash_set
 
 
 # 全局API认证实例
@@ -165,6 +240,6 @@ async def verify_api_key_dependency(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="无效的API密钥",
-            headers={"WWW-Authenticate": "Bearer"}
+            headers=_AUTH_HEADERS
         )
     return True
@@ -4,28 +4,67 @@
 提供内存缓存功能
 """
 
+import asyncio
+import functools
+import logging
+import math
 import time
-from typing import Any, Optional, Dict
+import heapq
+import itertools
+import pickle
 from collections import OrderedDict
-from threading import Lock
+from typing import Any, Optional, Dict, Hashable, List, Tuple
+from threading import Lock, local
 
 from core.logger import get_logger
 
+try:
+    from xxhash import xxh3_64_intdigest as _digest
+except ImportError:
+    # 未安装 xxhash 时使用内置哈希
+    _digest = hash
+
 logger = get_logger("cache")
 
+# 热路径上使用的函数绑定为模块级名称，省去每次调用时的属性查找
+_monotonic = time.monotonic
+_debug_enabled = logger.isEnabledFor
+
+# 命中时更新访问顺序的抽样间隔（每 N 次命中更新一次）
+TOUCH_SAMPLE_RATE = 8
+
+# 缓存分片数量（2 的幂，按键哈希取低位选择分片）
+SHARD_COUNT = 16
+_SHARD_MASK = SHARD_COUNT - 1
+
+# 过期堆中失效记录（键已被覆盖、删除或淘汰）的上限：
+# 堆长度超过存活项数的 HEAP_REBUILD_FACTOR 倍（且不少于 HEAP_REBUILD_MIN）时按存活项重建
+HEAP_REBUILD_FACTOR = 2
+HEAP_REBUILD_MIN = 64
+
 
-class CacheItem:
-    """缓存项"""
+class _Shard:
+    """缓存分片：独立的有序字典、锁和过期堆"""
     
-    def __init__(self, value: Any, ttl: int):
-        self.value = value
-        self.expire_time = time.time() + ttl if ttl > 0 else None
+    __slots__ = ("data", "lock", "heap")
     
-    def is_expired(self) -> bool:
-        """检查是否过期"""
-        if self.expire_time is None:
-            return False
-        return time.time() > self.expire_time
+    def __init__(self):
+        # OrderedDict 头部即最久未使用的项；读操作不加锁，只有写入和淘汰加锁
+        # 缓存项为 (值, 过期时间) 元组，过期时间基于单调时钟，math.inf 表示永不过期
+        self.data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.lock = Lock()
+        # 过期时间最小堆: (过期时间, 序号, 键)，序号保证不比较键本身
+        self.heap: List[Tuple[float, int, Hashable]] = []
+
+
+class _Counters:
+    """单个线程的命中/未命中计数，只由所属线程自增，读取时汇总"""
+    
+    __slots__ = ("hits", "misses")
+    
+    def __init__(self):
+        self.hits: int = 0
+        self.misses: int = 0
 
 
 class Cache:
@@ -43,19 +82,95 @@ class Cache:
         初始化缓存
         
         Args:
-            max_size: 最大缓存项数量
+            max_size: 最大缓存项数量（按分片均分，每个分片独立淘汰，
+                键分布不均时热点分片可能在总量未满时就开始淘汰）
             default_ttl: 默认过期时间（秒），0表示永不过期
         """
         if not hasattr(self, 'initialized'):
-            self.max_size = max_size
-            self.default_ttl = default_ttl
-            self.cache: OrderedDict[str, CacheItem] = OrderedDict()
-            self.lock = Lock()
-            self.hits = 0
-            self.misses = 0
+            self.max_size: int = max_size
+            self.default_ttl: int = default_ttl
+            # 按键哈希分片，每个分片各自加锁并维护 LRU 顺序，减少线程间的锁竞争
+            # 键可以是任意可哈希对象（如 cached 装饰器生成的元组键）
+            self._shards: List[_Shard] = [_Shard() for _ in range(SHARD_COUNT)]
+            # 向上取整，保证各分片容量之和不小于 max_size
+            self._shard_max_size: int = max(1, -(-max_size // SHARD_COUNT))
+            self._expiry_seq: itertools.count = itertools.count()
+            # 命中计数，用于抽样更新访问顺序
+            self._touch_tick: int = 0
+            # 命中/未命中按线程分别计数，读路径上自增无需加锁，统计时汇总所有线程
+            self._local = local()
+            self._counters: List[_Counters] = []
+            self._counters_lock = Lock()
             self.initialized = True
     
-    def get(self, key: str, default: Any = None) -> Any:
+    @property
+    def hits(self) -> int:
+        """命中次数"""
+        return sum(counters.hits for counters in self._counters)
+    
+    @property
+    def misses(self) -> int:
+        """未命中次数"""
+        return sum(counters.misses for counters in self._counters)
+    
+    def _thread_counters(self) -> _Counters:
+        """返回当前线程的计数器，首次调用时创建并登记"""
+        try:
+            return self._local.counters
+        except AttributeError:
+            counters = _Counters()
+            with self._counters_lock:
+                self._counters.append(counters)
+            self._local.counters = counters
+            return counters
+    
+    def _shard(self, key: Hashable) -> _Shard:
+        """返回键所在的分片"""
+        return self._shards[hash(key) & _SHARD_MASK]
+    
+    def try_get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        查找缓存，一次调用同时返回是否命中和缓存值
+        
+        Args:
+            key: 缓存键
+            
+        Returns:
+            (是否命中, 缓存值)，未命中时缓存值为 None
+        """
+        shard = self._shards[hash(key) & _SHARD_MASK]
+        data = shard.data
+        item = data.get(key)
+        if item is None:
+            self._thread_counters().misses += 1
+            if _debug_enabled(logging.DEBUG):
+                logger.debug("缓存未命中: %s", key)
+            return False, None
+        
+        # 检查是否过期
+        if item[1] <= _monotonic():
+            with shard.lock:
+                if data.get(key) is item:
+                    del data[key]
+            self._thread_counters().misses += 1
+            if _debug_enabled(logging.DEBUG):
+                logger.debug("缓存过期: %s", key)
+            return False, None
+        
+        # 每 TOUCH_SAMPLE_RATE 次命中才把该项移到末尾（近似 LRU），避免每次读都加锁
+        tick = (self._touch_tick + 1) % TOUCH_SAMPLE_RATE
+        self._touch_tick = tick
+        if tick == 0:
+            with shard.lock:
+                if data.get(key) is item:
+                    data.move_to_end(key)
+        
+        self._thread_counters().hits += 1
+        if _debug_enabled(logging.DEBUG):
+            logger.debug("缓存命中: %s", key)
+        return True, item[0]
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
         """
         获取缓存值
         
@@ -66,28 +181,10 @@ class Cache:
         Returns:
             缓存值或默认值
         """
-        with self.lock:
-            if key in self.cache:
-                item = self.cache[key]
-                
-                # 检查是否过期
-                if item.is_expired():
-                    del self.cache[key]
-                    self.misses += 1
-                    logger.debug(f"缓存过期: {key}")
-                    return default
-                
-                # 移到末尾（LRU）
-                self.cache.move_to_end(key)
-                self.hits += 1
-                logger.debug(f"缓存命中: {key}")
-                return item.value
-            
-            self.misses += 1
-            logger.debug(f"缓存未命中: {key}")
-            return default
+        found, value = self.try_get(key)
+        return value if found else default
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+    def set(self, key: Hashable, value: Any, ttl: Optional[int] = None):
         """
         设置缓存值
         
@@ -96,62 +193,117 @@ class Cache:
             value: 缓存值
             ttl: 过期时间（秒），None使用默认值
         """
-        with self.lock:
-            if ttl is None:
-                ttl = self.default_ttl
-            
+        if ttl is None:
+            ttl = self.default_ttl
+        # 使用单调时钟，不受系统时间调整影响
+        expire_time = _monotonic() + ttl if ttl > 0 else math.inf
+        shard = self._shards[hash(key) & _SHARD_MASK]
+        data = shard.data
+        
+        with shard.lock:
             # 如果已存在，先删除
-            if key in self.cache:
-                del self.cache[key]
+            data.pop(key, None)
             
-            # 如果超过最大大小，删除最旧的项
-            while len(self.cache) >= self.max_size:
-                oldest_key = next(iter(self.cache))
-                del self.cache[oldest_key]
-                logger.debug(f"缓存已满，删除最旧项: {oldest_key}")
+            # 如果超过分片容量，删除该分片中最旧的项
+            while len(data) >= self._shard_max_size:
+                oldest_key, _ = data.popitem(last=False)
+                if _debug_enabled(logging.DEBUG):
+                    logger.debug("缓存已满，删除最旧项: %s", oldest_key)
             
             # 添加新项
-            self.cache[key] = CacheItem(value, ttl)
-            logger.debug(f"缓存设置: {key}, TTL={ttl}秒")
+            data[key] = (value, expire_time)
+            if expire_time != math.inf:
+                heap = shard.heap
+                heapq.heappush(heap, (expire_time, next(self._expiry_seq), key))
+                if len(heap) > max(HEAP_REBUILD_MIN, HEAP_REBUILD_FACTOR * len(data)):
+                    self._rebuild_heap(shard)
+            if _debug_enabled(logging.DEBUG):
+                logger.debug("缓存设置: %s, TTL=%s秒", key, ttl)
     
-    def delete(self, key: str) -> bool:
+    @staticmethod
+    def _rebuild_heap(shard: _Shard):
+        """丢弃过期堆中已失效的记录并重新建堆（调用方需持有分片锁）"""
+        data = shard.data
+        heap = []
+        for entry in shard.heap:
+            item = data.get(entry[2])
+            if item is not None and item[1] == entry[0]:
+                heap.append(entry)
+        heapq.heapify(heap)
+        shard.heap = heap
+    
+    def delete(self, key: Hashable) -> bool:
         """
         删除缓存项
         
         Args:
             key: 缓存键
-            
+        
         Returns:
             是否删除成功
         """
-        with self.lock:
-            if key in self.cache:
-                del self.cache[key]
-                logger.debug(f"缓存删除: {key}")
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.data:
+                del shard.data[key]
+                if _debug_enabled(logging.DEBUG):
+                    logger.debug("缓存删除: %s", key)
                 return True
             return False
     
+    def delete_prefix(self, prefix: str) -> int:
+        """
+        删除指定前缀的所有缓存项
+        
+        Args:
+            prefix: 缓存键前缀
+        
+        Returns:
+            删除的项数
+        """
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                keys = [key for key in shard.data if isinstance(key, str) and key.startswith(prefix)]
+                for key in keys:
+                    del shard.data[key]
+            removed += len(keys)
+        
+        if removed and _debug_enabled(logging.DEBUG):
+            logger.debug("缓存前缀删除: %s, 共%s项", prefix, removed)
+        return removed
+    
     def clear(self):
         """清空缓存"""
-        with self.lock:
-            self.cache.clear()
-            self.hits = 0
-            self.misses = 0
-            logger.info("缓存已清空")
+        for shard in self._shards:
+            with shard.lock:
+                shard.data.clear()
+                shard.heap.clear()
+        with self._counters_lock:
+            for counters in self._counters:
+                counters.hits = 0
+                counters.misses = 0
+        logger.info("缓存已清空")
     
     def cleanup_expired(self):
         """清理过期项"""
-        with self.lock:
-            expired_keys = []
-            for key, item in self.cache.items():
-                if item.is_expired():
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                del self.cache[key]
-            
-            if expired_keys:
-                logger.info(f"清理了 {len(expired_keys)} 个过期缓存项")
+        now = _monotonic()
+        removed = 0
+        
+        for shard in self._shards:
+            with shard.lock:
+                heap = shard.heap
+                data = shard.data
+                while heap and heap[0][0] <= now:
+                    expire_time, _, key = heapq.heappop(heap)
+                    item = data.get(key)
+                    # 键被覆盖或删除后，堆中的旧记录直接丢弃
+                    if item is not None and item[1] == expire_time:
+                        del data[key]
+                        removed += 1
+        
+        if removed:
+            logger.info(f"清理了 {removed} 个过期缓存项")
     
     def get_stats(self) -> Dict:
         """
@@ -160,22 +312,23 @@ class Cache:
         Returns:
             统计信息字典
         """
-        with self.lock:
-            total_requests = self.hits + self.misses
-            hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
-            
-            return {
-                'size': len(self.cache),
-                'max_size': self.max_size,
-                'hits': self.hits,
-                'misses': self.misses,
-                'hit_rate': round(hit_rate, 2),
-                'total_requests': total_requests
-            }
+        hits = self.hits
+        misses = self.misses
+        total_requests = hits + misses
+        hit_rate = (hits / total_requests * 100) if total_requests > 0 else 0
+        
+        return {
+            'size': sum(len(shard.data) for shard in self._shards),
+            'max_size': self.max_size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hit_rate, 2),
+            'total_requests': total_requests
+        }
     
-    def exists(self, key: str) -> bool:
+    def exists(self, key: Hashable) -> bool:
         """
-        检查键是否存在且未过期
+        检查键是否存在且未过期（需要值时请直接使用 try_get）
         
         Args:
             key: 缓存键
@@ -183,16 +336,24 @@ class Cache:
         Returns:
             是否存在
         """
-        with self.lock:
-            if key not in self.cache:
-                return False
-            
-            item = self.cache[key]
-            if item.is_expired():
-                del self.cache[key]
-                return False
-            
-            return True
+        return self.try_get(key)[0]
+    
+    def snapshot(self) -> Dict[Hashable, Any]:
+        """
+        获取当前未过期缓存内容的副本（用于查看和调试）
+        
+        Returns:
+            键到缓存值的字典
+        """
+        now = _monotonic()
+        result = {}
+        for shard in self._shards:
+            with shard.lock:
+                items = list(shard.data.items())
+            result.update(
+                (key, value) for key, (value, expire_time) in items if expire_time > now
+            )
+        return result
 
 
 # 全局缓存实例
@@ -209,45 +370,54 @@ def cached(ttl: int = 60, key_prefix: str = ""):
         key_prefix: 缓存键前缀
     """
     def decorator(func):
-        async def async_wrapper(*args, **kwargs):
-            # 生成缓存键
-            cache_key = f"{key_prefix}{func.__name__}:{str(args)}:{str(kwargs)}"
-            
-            # 尝试从缓存获取
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
-                return cached_value
-            
-            # 执行函数
-            result = await func(*args, **kwargs)
+        # 绑定为闭包局部变量，调用时无需查找全局名和属性
+        _try_get = cache.try_get
+        _set = cache.set
+        _name = func.__qualname__
+        _pfx = key_prefix
+        
+        def make_key(args, kwargs):
+            # 直接用参数元组作为键，避免每次调用都 repr 参数
+            kw = tuple(sorted(kwargs.items())) if kwargs else ()
+            key = (_pfx, _name, args, kw)
+            try:
+                hash(key)
+                return key
+            except TypeError:
+                pass
             
-            # 存入缓存
-            cache.set(cache_key, result, ttl)
+            # 不可哈希的参数（如 dict/list）：对 pickle 字节求 64 位摘要
+            try:
+                return (_pfx, _name, _digest(pickle.dumps((args, kw), protocol=5)))
+            except Exception:
+                return f"{_pfx}{_name}:{args!r}:{kwargs!r}"
+        
+        # 在装饰时确定包装函数类型
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache_key = make_key(args, kwargs)
+                found, value = _try_get(cache_key)
+                if found:
+                    return value
+                
+                result = await func(*args, **kwargs)
+                _set(cache_key, result, ttl)
+                return result
             
-            return result
+            return async_wrapper
         
+        @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
-            # 生成缓存键
-            cache_key = f"{key_prefix}{func.__name__}:{str(args)}:{str(kwargs)}"
-            
-            # 尝试从缓存获取
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
-                return cached_value
+            cache_key = make_key(args, kwargs)
+            found, value = _try_get(cache_key)
+            if found:
+                return value
             
-            # 执行函数
             result = func(*args, **kwargs)
-            
-            # 存入缓存
-            cache.set(cache_key, result, ttl)
-            
+            _set(cache_key, result, ttl)
             return result
         
-        # 判断是否是异步函数
-        import asyncio
-        if asyncio.iscoroutinefunction(func):
-            return async_wrapper
-        else:
-            return sync_wrapper
+        return sync_wrapper
     
     return decorator
@@ -5,11 +5,32 @@
 """
 
 import os
-import json
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from functools import cached_property, lru_cache
 from pathlib import Path
 from typing import Any, Dict, Optional
+
+import orjson
 from cryptography.fernet import Fernet
 
+# 配置变更后延迟写盘的时间（秒），期间的多次修改合并为一次写入
+SAVE_DELAY_SECONDS = 1.0
+
+# 记录的无法解密数据的最大条数
+INVALID_TOKEN_CACHE_SIZE = 128
+
+# 配置中不存在的键在值缓存中的占位
+_MISSING = object()
+
+
+@lru_cache(maxsize=256)
+def _split(key: str) -> tuple:
+    """解析点号分隔的配置键（结果缓存）"""
+    return tuple(key.split('.'))
+
 
 class ConfigManager:
     """配置管理器"""
@@ -30,9 +51,22 @@ class ConfigManager:
             
             # 加载或生成加密密钥
             self._load_or_generate_key()
+            # 已确认无法解密的数据（LRU，最多 INVALID_TOKEN_CACHE_SIZE 条），重复出现时直接返回
+            self._invalid_tokens: "OrderedDict[bytes, None]" = OrderedDict()
             
             # 加载配置
             self.config = self._load_config()
+            # 配置版本号，配置变更或重新加载时递增，供缓存判断是否失效
+            self.version = 0
+            # 已解析的配置值: 键 -> (配置版本, 值)
+            self._cache: Dict[str, tuple] = {}
+            
+            # 配置有未保存的修改时置位，由后台线程延迟写盘
+            self._dirty = threading.Event()
+            self._save_lock = threading.Lock()
+            self._save_thread = threading.Thread(target=self._saver, name="config-saver", daemon=True)
+            self._save_thread.start()
+            atexit.register(self.flush)
             self.initialized = True
     
     def _load_or_generate_key(self):
@@ -46,20 +80,27 @@ class ConfigManager:
                 f.write(self.secret_key)
             # 设置文件权限（仅所有者可读写）
             os.chmod(self.secret_key_file, 0o600)
-        
-        self.cipher = Fernet(self.secret_key)
+    
+    @cached_property
+    def cipher(self) -> Fernet:
+        """Fernet 加密器，首次加解密时才创建"""
+        return Fernet(self.secret_key)
     
     def _load_config(self) -> Dict:
         """加载配置文件"""
         if self.config_file.exists():
             try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return orjson.loads(self.config_file.read_bytes())
             except Exception as e:
                 print(f"加载配置失败: {e}")
                 return self._get_default_config()
         return self._get_default_config()
     
+    def reload_config(self):
+        """重新从文件加载配置"""
+        self.config = self._load_config()
+        self.version += 1
+    
     def _get_default_config(self) -> Dict:
         """获取默认配置"""
         return {
@@ -101,13 +142,29 @@ class ConfigManager:
         }
     
     def save_config(self):
-        """保存配置到文件"""
+        """保存配置到文件（先写临时文件再原子替换）"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=2)
+            with self._save_lock:
+                tmp_file = self.config_file.with_suffix('.json.tmp')
+                tmp_file.write_bytes(orjson.dumps(self.config, option=orjson.OPT_INDENT_2))
+                os.replace(tmp_file, self.config_file)
         except Exception as e:
             print(f"保存配置失败: {e}")
     
+    def _saver(self):
+        """后台写盘线程：有修改时等待一段时间后统一保存"""
+        while True:
+            self._dirty.wait()
+            time.sleep(SAVE_DELAY_SECONDS)
+            self._dirty.clear()
+            self.save_config()
+    
+    def flush(self):
+        """立即保存尚未写盘的修改（进程退出时自动调用）"""
+        if self._dirty.is_set():
+            self._dirty.clear()
+            self.save_config()
+    
     def get(self, key: str, default: Any = None) -> Any:
         """
         获取配置值（支持点号分隔的嵌套键）
@@ -119,16 +176,22 @@ class ConfigManager:
         Returns:
             配置值
         """
-        keys = key.split('.')
-        value = self.config
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == self.version:
+            value = cached[1]
+            return default if value is _MISSING else value
         
-        for k in keys:
+        version = self.version
+        value = self.config
+        for k in _split(key):
             if isinstance(value, dict) and k in value:
                 value = value[k]
             else:
-                return default
+                value = _MISSING
+                break
         
-        return value
+        self._cache[key] = (version, value)
+        return default if value is _MISSING else value
     
     def set(self, key: str, value: Any):
         """
@@ -138,7 +201,7 @@ class ConfigManager:
             key: 配置键，如 "server.host"
             value: 配置值
         """
-        keys = key.split('.')
+        keys = _split(key)
         config = self.config
         
         for k in keys[:-1]:
@@ -147,7 +210,44 @@ class ConfigManager:
             config = config[k]
         
         config[keys[-1]] = value
-        self.save_config()
+        self.version += 1
+        # 由后台线程延迟保存，不阻塞调用方
+        self._dirty.set()
+    
+    def encrypt_bytes(self, data: bytes) -> bytes:
+        """
+        加密字节数据
+        
+        Args:
+            data: 要加密的字节
+            
+        Returns:
+            加密后的字节
+        """
+        return self.cipher.encrypt(data)
+    
+    def decrypt_bytes(self, encrypted_data: bytes) -> bytes:
+        """
+        解密字节数据
+        
+        Args:
+            encrypted_data: 加密的字节
+            
+        Returns:
+            解密后的字节，失败时返回空字节
+        """
+        invalid_tokens = self._invalid_tokens
+        if encrypted_data in invalid_tokens:
+            invalid_tokens.move_to_end(encrypted_data)
+            return b""
+        try:
+            return self.cipher.decrypt(encrypted_data)
+        except Exception as e:
+            print(f"解密失败: {e}")
+            invalid_tokens[encrypted_data] = None
+            if len(invalid_tokens) > INVALID_TOKEN_CACHE_SIZE:
+                invalid_tokens.popitem(last=False)
+            return b""
     
     def encrypt(self, data: str) -> str:
         """
@@ -159,7 +259,7 @@ class ConfigManager:
         Returns:
             加密后的字符串
         """
-        return self.cipher.encrypt(data.encode()).decode()
+        return self.encrypt_bytes(data.encode()).decode()
     
     def decrypt(self, encrypted_data: str) -> str:
         """
@@ -171,11 +271,7 @@ class ConfigManager:
         Returns:
             解密后的字符串
         """
-        try:
-            return self.cipher.decrypt(encrypted_data.encode()).decode()
-        except Exception as e:
-            print(f"解密失败: {e}")
-            return ""
+        return self.decrypt_bytes(encrypted_data.encode()).decode()
 
 
 # 全局配置管理器实例
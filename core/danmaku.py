@@ -5,18 +5,45 @@ B站直播弹幕客户端
 """
 
 import asyncio
-import json
+import functools
+import logging
+import random
+import re
 import struct
-import zlib
-from typing import Optional, Dict, Callable
+import time
+import traceback
+from collections import OrderedDict
+from typing import Optional, Dict, Callable, List, Tuple
 from enum import IntEnum
 
 import httpx
+import orjson
 import websockets
 
+from core.logger import get_logger
 from core.wbi_sign import sign_params
 from core.interact_word_v2_parser import parse_interact_word_v2
 
+logger = get_logger("danmaku")
+# 逐条消息的调试输出先检查日志级别，未开启时不格式化
+_debug_enabled = logger.isEnabledFor
+# 事件时间戳在热路径上频繁获取，绑定为模块级名称省去属性查找
+_now = time.time
+
+# 优先使用 SIMD 加速的 isal 解压 zlib，未安装时使用标准库
+try:
+    from isal.isal_zlib import decompress as _zlib_decompress
+except ImportError:
+    from zlib import decompress as _zlib_decompress
+
+try:
+    from brotli import decompress as _brotli_decompress
+except ImportError:
+    try:
+        from brotlicffi import decompress as _brotli_decompress
+    except ImportError:
+        _brotli_decompress = None
+
 
 class Operation(IntEnum):
     """B站直播协议操作码"""
@@ -44,6 +71,8 @@ class PacketHeader:
     """数据包头部"""
     HEADER_STRUCT = struct.Struct('>I2H2I')
     
+    __slots__ = ('packet_length', 'header_length', 'protocol_version', 'operation', 'sequence_id')
+    
     def __init__(self, packet_length: int, header_length: int, protocol_version: int,
                  operation: int, sequence_id: int):
         self.packet_length = packet_length
@@ -53,23 +82,12 @@ class PacketHeader:
         self.sequence_id = sequence_id
     
     @classmethod
-    def from_bytes(cls, data: bytes):
-        """从字节流解析包头"""
-        try:
-            # 确保数据长度足够
-            if len(data) < 16:
-                raise ValueError("数据长度不足")
-            
-            # 解析包头
-            fields = cls.HEADER_STRUCT.unpack(data[:16])
-            return cls(*fields)
-        except struct.error as e:
-            # 如果解析失败，尝试使用小端序
-            try:
-                fields = struct.Struct('<I2H2I').unpack(data[:16])
-                return cls(*fields)
-            except:
-                raise ValueError(f"解析包头失败: {e}")
+    def from_bytes(cls, data: bytes, offset: int = 0):
+        """从字节流解析包头（协议固定为大端序）"""
+        if len(data) - offset < 16:
+            raise ValueError("数据长度不足")
+        
+        return cls(*cls.HEADER_STRUCT.unpack_from(data, offset))
     
     def to_bytes(self) -> bytes:
         """转换为字节流"""
@@ -82,8 +100,80 @@ class PacketHeader:
         )
 
 
+def split_packets(data: bytes) -> List[Tuple[int, int, memoryview]]:
+    """
+    按包头中的长度切分数据包（收包和解析合并消息共用）
+    
+    Args:
+        data: 由完整数据包组成的字节流
+        
+    Returns:
+        [(操作码, 协议版本, 包体)]，包体为不复制数据的 memoryview
+    """
+    packets = []
+    append = packets.append
+    unpack_header = _HEADER_UNPACK_FROM
+    view = memoryview(data)
+    offset = 0
+    data_len = len(data)
+    
+    while data_len - offset >= 16:
+        packet_length, _, protocol_version, operation, _ = unpack_header(data, offset)
+        end = offset + packet_length
+        if packet_length < 16 or end > data_len:
+            logger.warning("数据包长度异常: %s，丢弃剩余 %s 字节", packet_length, data_len - offset)
+            break
+        
+        append((operation, protocol_version, view[offset + 16:end]))
+        offset = end
+    
+    return packets
+
+
+def install_uvloop() -> bool:
+    """
+    安装 uvloop 作为事件循环策略（需在 asyncio.run() 之前调用）
+    
+    Returns:
+        是否安装成功（未安装 uvloop 或在 Windows 上返回 False）
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    
+    uvloop.install()
+    return True
+
+
+_HEADER_UNPACK_FROM = PacketHeader.HEADER_STRUCT.unpack_from
+
+# 用户名清理：控制字符（保留 \t\n\r，随后按空白处理）、B站头像URL（到图片扩展名或空白为止）、连续空白
+_CTRL_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_BFS_URL_RE = re.compile(r'http\S*?bfs/face/(?:\S*?\.(?:jpe?g|png|gif|webp)|\S*)')
+# 只匹配需要规范化的空白（连续空白或非空格的空白字符），单个空格不算匹配，
+# 常见的无多余空白的用户名不会产生新字符串
+_WS_RE = re.compile(r'\s{2,}|[^\S ]')
+
+# INTERACT_WORD_V2 的互动类型名称（仅用于调试输出）
+_MSG_TYPE_NAMES = {
+    1: "进入",
+    2: "关注",
+    3: "分享",
+    4: "特别关注",
+    5: "互粉",
+    6: "点赞"
+}
+
+
 class DanmakuClient:
-    """B站直播弹幕客户端"""
+    """
+    B站直播弹幕客户端
+    
+    所有 I/O 都在 asyncio 上完成，推荐使用 uvloop 驱动事件循环：
+    通过 uvicorn 运行时已安装 uvloop 会自动选用；
+    单独运行时在 asyncio.run() 之前调用 install_uvloop()
+    """
     
     # WebSocket 服务器地址
     WS_URL = "wss://broadcastlv.chat.bilibili.com/sub"
@@ -93,6 +183,31 @@ class DanmakuClient:
     # 使用旧端点，不需要 WBI 签名
     DANMU_INFO_URL = "https://api.live.bilibili.com/room/v1/Danmu/getConf"
     
+    # HTTP 请求头，创建连接池时统一设置
+    DEFAULT_HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Referer": "https://live.bilibili.com/",
+    }
+    
+    # 超过该大小（字节）的压缩帧在工作线程中解压
+    THREAD_DECOMPRESS_THRESHOLD = 4096
+    
+    # 人气值变化（WATCHED_CHANGE）回调的合并窗口（秒），窗口内只回调最新值
+    ONLINE_COALESCE_SECONDS = 0.5
+    
+    # 用户检测记录的最大用户数
+    MAX_TRACKED_USERS = 50000
+    
+    # 心跳包内容固定，预先构造好整个数据包
+    HEARTBEAT_BODY = b"[object Object]"
+    HEARTBEAT_PACKET = PacketHeader(
+        packet_length=16 + len(HEARTBEAT_BODY),
+        header_length=16,
+        protocol_version=1,
+        operation=Operation.HEARTBEAT,
+        sequence_id=1
+    ).to_bytes() + HEARTBEAT_BODY
+    
     def __init__(self, room_id: int, cookies: Optional[Dict] = None):
         """
         初始化弹幕客户端
@@ -113,6 +228,9 @@ class DanmakuClient:
         self.heartbeat_task = None
         self.receive_task = None
         self.reconnect_task = None  # 重连任务
+        self._online_latest: Optional[int] = None  # 待回调的最新人气值
+        self._online_event = asyncio.Event()  # 有新的人气值待回调
+        self._online_consumer_task: Optional[asyncio.Task] = None  # 人气值回调任务
 
         # 消息回调函数
         self.on_danmaku: Optional[Callable] = None
@@ -123,24 +241,53 @@ class DanmakuClient:
         self.on_online: Optional[Callable] = None
         self.on_disconnect: Optional[Callable] = None  # 断开连接回调
 
-        # 数据包缓冲区
-        self.buffer = bytearray()
-
         # HTTP客户端（连接池）
         self.http_client: Optional[httpx.AsyncClient] = None
 
+        # 消息命令 -> 处理函数
+        self._dispatch: Dict[str, Callable] = {
+            "DANMU_MSG": self._handle_danmaku,  # 普通弹幕
+            "SEND_GIFT": self._handle_gift,  # 礼物
+            "SUPER_CHAT_MESSAGE": self._handle_superchat,  # 醒目留言（SC）
+            "GUARD_BUY": self._handle_guard,  # 上舰
+            "INTERACT_WORD": self._handle_interact,  # 用户进入直播间（旧版本，已被INTERACT_WORD_V2替换）
+            "INTERACT_WORD_V2": self._handle_interact_v2,  # 用户进入直播间V2（新版本，使用protobuf）
+            "WATCHED_CHANGE": self._handle_watch,  # 人气值变化
+            "ENTRY_EFFECT": self._handle_entry_effect,  # 进入特效（舰长进入）
+            "ONLINE_RANK_COUNT": self._handle_rank_count,  # 在线人数
+        }
+
+        # 插件管理器，通过 plugin_manager 属性设置；实现了 on_interact 的已启用插件在插件变更时重建
+        self._plugin_manager = None
+        self._interact_plugins: tuple = ()
+
         # 用户检测相关
-        self.user_first_seen = {}  # 记录用户首次出现 {uid: {"name": str, "time": float, "source": str}}
-        self.user_enter_history = set()  # 记录已进入的用户 {uid:name}
+        # 两者都按插入顺序保留最近的 MAX_TRACKED_USERS 个用户，避免长时间运行时无限增长
+        self.user_first_seen: OrderedDict = OrderedDict()  # 记录用户首次出现 {uid: (name, time, source)}，按首次出现时间排序
+        self.user_enter_history: OrderedDict = OrderedDict()  # 记录已进入的用户 {uid: None}，按最近进入排序
+    
+    @property
+    def plugin_manager(self):
+        """插件管理器"""
+        return self._plugin_manager
+    
+    @plugin_manager.setter
+    def plugin_manager(self, manager):
+        self._plugin_manager = manager
+        if manager is not None:
+            manager.add_change_listener(self._refresh_interact_plugins)
+        self._refresh_interact_plugins()
+    
+    def _refresh_interact_plugins(self):
+        """重建处理 on_interact 的插件列表（由插件管理器在插件变更时回调）"""
+        manager = self._plugin_manager
+        self._interact_plugins = manager.get_enabled_plugins('on_interact') if manager is not None else ()
     
     async def connect(self):
         """连接到直播间"""
         try:
-            # 创建HTTP客户端（连接池）
-            self.http_client = httpx.AsyncClient(
-                cookies=self.cookies,
-                timeout=httpx.Timeout(5.0, connect=3.0)  # 优化超时时间
-            )
+            # HTTP客户端（连接池），重连时复用已建立的连接
+            self._get_http_client()
             
             # 并行获取真实房间号和弹幕服务器信息
             print(f"正在获取房间信息...")
@@ -166,6 +313,8 @@ class DanmakuClient:
                 self.ws = await asyncio.wait_for(
                     websockets.connect(
                         self.WS_URL,
+                        # 消息已在应用层压缩（protover=2/3），不协商 permessage-deflate
+                        compression=None,
                         ping_interval=30,
                         ping_timeout=10,
                         close_timeout=1
@@ -204,20 +353,18 @@ class DanmakuClient:
                     print("认证失败，连接已关闭")
                     return False
 
-            # 初始化缓冲区
-            self.buffer = bytearray()
-
             self.running = True
 
             # 启动心跳和接收循环
             self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
             self.receive_task = asyncio.create_task(self._receive_loop())
+            if self._online_consumer_task is None or self._online_consumer_task.done():
+                self._online_consumer_task = asyncio.create_task(self._online_consumer())
 
             print(f"已连接到直播间 {self.real_room_id}")
             return True
         except Exception as e:
             print(f"连接失败: {e}")
-            import traceback
             traceback.print_exc()
 
             # 确保在失败时清理所有状态
@@ -233,6 +380,23 @@ class DanmakuClient:
 
             return False
     
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        获取共享的 HTTP 客户端，在多次重连之间保持连接池
+        
+        Returns:
+            httpx.AsyncClient: 客户端实例
+        """
+        if self.http_client is None or self.http_client.is_closed:
+            self.http_client = httpx.AsyncClient(
+                cookies=self.cookies,
+                headers=self.DEFAULT_HEADERS,
+                http2=True,
+                timeout=httpx.Timeout(5.0, connect=3.0),  # 优化超时时间
+                limits=httpx.Limits(max_keepalive_connections=5)
+            )
+        return self.http_client
+    
     async def disconnect(self):
         """断开连接"""
         # 先设置运行标志为 False
@@ -250,6 +414,9 @@ class DanmakuClient:
         if self.reconnect_task and not self.reconnect_task.done():
             self.reconnect_task.cancel()
             tasks.append(self.reconnect_task)
+        if self._online_consumer_task and not self._online_consumer_task.done():
+            self._online_consumer_task.cancel()
+            tasks.append(self._online_consumer_task)
 
         # 等待任务取消
         if tasks:
@@ -271,6 +438,7 @@ class DanmakuClient:
         self.heartbeat_task = None
         self.receive_task = None
         self.reconnect_task = None
+        self._online_consumer_task = None
         self.ws = None
 
         # 清理回调函数
@@ -295,25 +463,20 @@ class DanmakuClient:
     async def _get_real_room_id(self):
         """获取真实房间号（短号转长号）"""
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Referer": "https://live.bilibili.com/",
-            }
-            # 使用连接池
+            # 使用连接池（请求头已在客户端上设置）
             response = await self.http_client.get(
                 self.ROOM_INFO_URL,
-                params={"room_id": self.room_id},
-                headers=headers
+                params={"room_id": self.room_id}
             )
-            print(f"获取真实房间号响应: {response.status_code}, 内容长度: {len(response.text)}")
-            data = response.json()
+            print(f"获取真实房间号响应: {response.status_code}, 内容长度: {len(response.content)}")
+            data = orjson.loads(response.content)
             
             if data.get("code") == 0:
                 self.real_room_id = data["data"]["room_id"]
                 print(f"真实房间号: {self.real_room_id}")
             else:
                 print(f"获取真实房间号失败: code={data.get('code')}, message={data.get('message')}")
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             print(f"获取真实房间号失败: JSON解析错误 - {e}")
             print(f"响应内容: {response.text[:200]}")
         except Exception as e:
@@ -322,26 +485,20 @@ class DanmakuClient:
     async def _get_danmu_info(self) -> Dict:
         """获取弹幕服务器信息"""
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Referer": "https://live.bilibili.com/",
-            }
-
             # 使用旧端点，参数名为 room_id
             params = {"room_id": self.real_room_id}
             print(f"获取弹幕信息，房间号: {self.real_room_id}")
 
-            # 使用连接池
+            # 使用连接池（请求头已在客户端上设置）
             response = await self.http_client.get(
                 self.DANMU_INFO_URL,
-                params=params,
-                headers=headers
+                params=params
             )
-            print(f"获取弹幕信息响应: {response.status_code}, 内容长度: {len(response.text)}")
+            print(f"获取弹幕信息响应: {response.status_code}, 内容长度: {len(response.content)}")
 
             # 尝试解析 JSON
             try:
-                data = response.json()
+                data = orjson.loads(response.content)
             except Exception as json_error:
                 print(f"JSON 解析失败: {json_error}")
                 print(f"响应内容: {response.text[:200]}")
@@ -366,13 +523,12 @@ class DanmakuClient:
                 message = data.get("message")
                 print(f"获取弹幕信息失败: code={code}, message={message}")
                 return {}
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             print(f"获取弹幕服务器信息失败: JSON解析错误 - {e}")
             print(f"响应内容: {response.text[:200]}")
             return {}
         except Exception as e:
             print(f"获取弹幕服务器信息失败: {e}")
-            import traceback
             traceback.print_exc()
             return {}
     
@@ -396,12 +552,12 @@ class DanmakuClient:
         }
 
         print(f"认证数据: uid={uid}, roomid={self.real_room_id}, token={'有' if token else '无'}")
-        await self._send_packet(Operation.AUTH, json.dumps(auth_data))
+        await self._send_packet(Operation.AUTH, orjson.dumps(auth_data))
         print("认证包已发送")
     
-    async def _send_packet(self, operation: int, body: str = ""):
-        """发送数据包"""
-        body_bytes = body.encode('utf-8')
+    async def _send_packet(self, operation: int, body=b""):
+        """发送数据包（包体可以是 str 或已编码的 bytes）"""
+        body_bytes = body.encode('utf-8') if isinstance(body, str) else body
         header = PacketHeader(
             packet_length=len(body_bytes) + 16,
             header_length=16,
@@ -417,7 +573,7 @@ class DanmakuClient:
         """心跳循环（30秒间隔）"""
         try:
             while self.running:
-                await self._send_packet(Operation.HEARTBEAT, "[object Object]")
+                await self.ws.send(self.HEARTBEAT_PACKET)
                 # 使用更短的睡眠间隔以便更快响应取消
                 for _ in range(30):
                     if not self.running:
@@ -434,11 +590,7 @@ class DanmakuClient:
             while self.running:
                 try:
                     data = await self.ws.recv()
-                    # 将接收到的数据追加到缓冲区
-                    self.buffer.extend(data)
-
-                    # 处理缓冲区中的数据
-                    await self._handle_packet(self.buffer)
+                    await self._handle_packet(data)
                 except websockets.exceptions.ConnectionClosed as e:
                     if self.running:  # 只有在应该运行时才打印错误
                         print(f"WebSocket 连接已关闭: code={e.code}, reason={e.reason}")
@@ -455,214 +607,116 @@ class DanmakuClient:
             pass
         except Exception as e:
             print(f"接收循环错误: {e}")
-            import traceback
             traceback.print_exc()
             self.running = False
-        finally:
-            # 清理缓冲区
-            self.buffer.clear()
-
-    async def _handle_packet(self, buffer):
-        """处理数据包"""
-        # 确保 buffer 是 bytearray 类型
-        if isinstance(buffer, bytes):
-            buffer = bytearray(buffer)
-
-        offset = 0
-        buffer_len = len(buffer)
-        error_count = 0  # 错误计数器
-        max_errors = 5  # 减少最大错误次数
-
-        while offset < buffer_len and error_count < max_errors:
-            try:
-                # 检查是否有足够的数据来读取包头
-                if buffer_len - offset < 16:
-                    # 数据不足，保留在缓冲区中等待更多数据
-                    break
-
-                # 尝试同步到有效的包头
-                # B站协议的包头长度通常是16字节，且第一个字段是包的总长度
-                # 我们可以通过查找合理的包长度来同步
-                sync_found = False
-                for sync_offset in range(min(16, buffer_len - offset - 16)):
-                    test_offset = offset + sync_offset
-                    try:
-                        # 尝试解析包头
-                        test_header = PacketHeader.from_bytes(bytes(buffer[test_offset:]))
-                        
-                        # 检查是否是有效的包头
-                        if (16 <= test_header.packet_length <= 10000 and
-                            test_header.header_length == 16 and
-                            0 <= test_header.operation <= 1000):
-                            # 找到有效的包头
-                            offset = test_offset
-                            header = test_header
-                            sync_found = True
-                            break
-                    except:
-                        continue
-                
-                if not sync_found:
-                    # 没有找到有效的包头，跳过1字节继续尝试
-                    offset += 1
-                    error_count += 1
-                    continue
-
-                # 检查数据包是否完整
-                if buffer_len - offset < header.packet_length:
-                    # 数据包不完整，保留在缓冲区中等待更多数据
-                    break
 
-                # 提取包体
-                body = bytes(buffer[offset + 16:offset + header.packet_length])
-
-                # 根据操作码处理
-                if header.operation == Operation.HEARTBEAT_REPLY:
-                    # 心跳回复，包含在线人数
-                    if len(body) == 4:
-                        try:
-                            online = struct.unpack('>I', body)[0]
-                            print(f"[人气值] 心跳回复在线人数: {online}")
-                            if self.on_online:
-                                await self.on_online({"online": online, "source": "heartbeat"})
-                        except Exception as e:
-                            print(f"解析心跳回复错误: {e}")
-                            pass
-
-                elif header.operation == Operation.SEND_MSG_REPLY:
-                    # 消息推送
+    async def _handle_packet(self, data: bytes):
+        """
+        处理一条 WebSocket 消息中的数据包
+        
+        WebSocket 本身按消息分帧，每条消息都由完整的数据包组成，
+        因此直接按包头中的长度逐个解析，无需跨消息缓冲或重新同步
+        """
+        for operation, protocol_version, body in split_packets(data):
+            # 根据操作码处理
+            if operation == Operation.HEARTBEAT_REPLY:
+                # 心跳回复，包含在线人数
+                if len(body) == 4:
                     try:
-                        await self._handle_message(body, header.protocol_version)
+                        online = int.from_bytes(body, 'big')
+                        if _debug_enabled(logging.DEBUG):
+                            logger.debug("[人气值] 心跳回复在线人数: %s", online)
+                        if self.on_online:
+                            await self.on_online({"online": online, "source": "heartbeat"})
                     except Exception as e:
-                        print(f"处理消息错误: {e}")
-
-                elif header.operation == Operation.AUTH_REPLY:
-                    # 认证回复
-                    if len(body) > 0:
-                        try:
-                            auth_reply = json.loads(body.decode('utf-8', errors='ignore'))
-                            print(f"认证回复: {auth_reply}")
-                        except:
-                            print("认证成功（无法解析详细回复）")
-                    else:
-                        print("认证成功")
-
-                # 成功处理一个包，重置错误计数
-                error_count = 0
-                offset += header.packet_length
-
-            except Exception as e:
-                error_count += 1
-                if error_count < 3:
-                    print(f"处理数据包错误: {e}")
-                # 跳过这个错误的数据包
-                if buffer_len - offset >= 1:
-                    offset += 1
+                        print(f"解析心跳回复错误: {e}")
+            
+            elif operation == Operation.SEND_MSG_REPLY:
+                # 消息推送（_process_envelope 自行处理异常）
+                await self._process_envelope(body, protocol_version)
+            
+            elif operation == Operation.AUTH_REPLY:
+                # 认证回复
+                if len(body) > 0:
+                    try:
+                        auth_reply = orjson.loads(body)
+                        print(f"认证回复: {auth_reply}")
+                    except orjson.JSONDecodeError:
+                        print("认证成功（无法解析详细回复）")
                 else:
-                    break
-
-        # 如果错误次数过多，清空缓冲区
-        if error_count >= max_errors:
-            print("数据包解析错误过多，清空缓冲区")
-            buffer.clear()
-            offset = 0
-
-        # 删除已处理的数据（仅当是 bytearray 时）
-        if offset > 0 and isinstance(buffer, bytearray):
-            del buffer[:offset]
+                    print("认证成功")
 
-    async def _handle_message(self, body: bytes, protocol_version: int):
-        """处理消息体"""
+    async def _decompress(self, decompress: Callable[[bytes], bytes], body: bytes) -> bytes:
+        """
+        解压消息体，大帧放到工作线程中解压（解压时会释放 GIL），避免阻塞事件循环
+        
+        Args:
+            decompress: 解压函数
+            body: 压缩的消息体
+            
+        Returns:
+            解压后的数据
+        """
+        if len(body) > self.THREAD_DECOMPRESS_THRESHOLD:
+            return await asyncio.to_thread(decompress, body)
+        return decompress(body)
+    
+    async def _process_envelope(self, body: bytes, protocol_version: int):
+        """
+        处理消息推送包：按协议版本解压后，逐条解析并分发其中的消息
+        
+        Args:
+            body: 包体
+            protocol_version: 协议版本（0-未压缩，2-zlib，3-Brotli）
+        """
         try:
             # 根据协议版本解压
-            if protocol_version == 0:
-                # 未压缩
-                messages = [body]
-            elif protocol_version == 2:
-                # zlib 压缩
-                decompressed = zlib.decompress(body)
-                messages = [decompressed]
+            if protocol_version == 2:
+                payload = await self._decompress(_zlib_decompress, body)
             elif protocol_version == 3:
-                # Brotli 压缩
-                try:
-                    import brotli
-                    decompressed = brotli.decompress(body)
-                    messages = [decompressed]
-                except ImportError:
-                    # 如果没有 brotli，尝试 zlib
-                    decompressed = zlib.decompress(body)
-                    messages = [decompressed]
+                # 没有 brotli 库时尝试 zlib
+                decompress = _brotli_decompress if _brotli_decompress is not None else _zlib_decompress
+                payload = await self._decompress(decompress, body)
             else:
-                messages = [body]
+                # 未压缩的包体就是一条 JSON 消息，不含嵌套的数据包
+                try:
+                    msg = orjson.loads(body)
+                except orjson.JSONDecodeError:
+                    msg = None
+                if msg is not None:
+                    await self._dispatch_message(msg)
+                return
             
-            # 解析消息
-            for msg_data in messages:
-                await self._parse_messages(msg_data)
-        except Exception as e:
-            print(f"处理消息错误: {e}")
-    
-    async def _parse_messages(self, data: bytes):
-        """解析消息（可能包含多条）"""
-        offset = 0
-        
-        while offset < len(data):
-            try:
-                header = PacketHeader.from_bytes(data[offset:])
-                body = data[offset + 16:offset + header.packet_length]
-                
-                if header.operation == Operation.SEND_MSG_REPLY:
+            # 解压后的数据由多条完整数据包组成，循环内用到的函数先绑定为局部变量
+            loads = orjson.loads
+            decode_error = orjson.JSONDecodeError
+            dispatch = self._dispatch_message
+            send_msg_reply = Operation.SEND_MSG_REPLY
+            for operation, _, msg_body in split_packets(payload):
+                if operation == send_msg_reply:
                     try:
-                        msg = json.loads(body.decode('utf-8', errors='ignore'))
-                        await self._dispatch_message(msg)
-                    except json.JSONDecodeError:
-                        pass
-                
-                offset += header.packet_length
-            except Exception as e:
-                break
+                        # orjson 直接解析 UTF-8 字节，无需先解码为 str
+                        msg = loads(msg_body)
+                    except decode_error:
+                        msg = None
+                    if msg is not None:
+                        await dispatch(msg)
+        except Exception as e:
+            logger.error("处理消息错误: %s", e)
     
     async def _dispatch_message(self, msg: dict):
         """分发消息到对应的处理函数"""
-        cmd = msg.get("cmd", "")
-
-        # 普通弹幕
-        if cmd == "DANMU_MSG":
-            await self._handle_danmaku(msg)
-
-        # 礼物
-        elif cmd == "SEND_GIFT":
-            await self._handle_gift(msg)
-
-        # 醒目留言（SC）
-        elif cmd == "SUPER_CHAT_MESSAGE":
-            await self._handle_superchat(msg)
-
-        # 上舰
-        elif cmd == "GUARD_BUY":
-            await self._handle_guard(msg)
-
-        # 用户进入直播间（旧版本，已被INTERACT_WORD_V2替换）
-        elif cmd == "INTERACT_WORD":
-            await self._handle_interact(msg)
-        
-        # 用户进入直播间V2（新版本，使用protobuf）
-        elif cmd == "INTERACT_WORD_V2":
-            await self._handle_interact_v2(msg)
-
-        # 用户关注
-        elif cmd == "WATCHED_CHANGE":
-            await self._handle_watch(msg)
-
-        # 进入特效（舰长进入）
-        elif cmd == "ENTRY_EFFECT":
-            await self._handle_entry_effect(msg)
-
-        # 在线人数
-        elif cmd == "ONLINE_RANK_COUNT":
-            count = msg.get("data", {}).get("count", 0)
-            print(f"[人气值] ONLINE_RANK_COUNT在线人数: {count}")
-            if self.on_online:
-                await self.on_online({"online": count, "source": "rank_count"})
+        handler = self._dispatch.get(msg.get("cmd"))
+        if handler is not None:
+            await handler(msg)
+    
+    async def _handle_rank_count(self, msg: dict):
+        """处理在线人数（ONLINE_RANK_COUNT）"""
+        count = msg.get("data", {}).get("count", 0)
+        if _debug_enabled(logging.DEBUG):
+            logger.debug("[人气值] ONLINE_RANK_COUNT在线人数: %s", count)
+        if self.on_online:
+            await self.on_online({"online": count, "source": "rank_count"})
     
     async def _handle_danmaku(self, msg: dict):
         """处理弹幕消息"""
@@ -671,41 +725,36 @@ class DanmakuClient:
             if len(info) < 3:
                 return
             
+            meta = info[0]
+            user = info[2]
+            user_uid = user[0]  # 用户 UID
+            user_name = user[1]  # 用户名
+            medal = info[3] if len(info) > 3 else None
+            
             data = {
                 "type": "danmaku",
                 "content": info[1],  # 弹幕内容
                 "user": {
-                    "uid": info[2][0],  # 用户 UID
-                    "uname": info[2][1],  # 用户名
-                    "is_admin": info[2][2] == 1,  # 是否房管
-                    "is_vip": info[2][3] == 1,  # 是否月费老爷
-                    "is_svip": info[2][4] == 1,  # 是否年费老爷
+                    "uid": user_uid,
+                    "uname": user_name,
+                    "is_admin": user[2] == 1,  # 是否房管
+                    "is_vip": user[3] == 1,  # 是否月费老爷
+                    "is_svip": user[4] == 1,  # 是否年费老爷
                 },
-                "medal": None,
-                "timestamp": info[0][4] if len(info[0]) > 4 else 0
+                # 粉丝勋章
+                "medal": {
+                    "level": medal[0],
+                    "name": medal[1],
+                    "anchor_uname": medal[2],
+                    "anchor_room_id": medal[3]
+                } if medal else None,
+                "timestamp": meta[4] if len(meta) > 4 else 0
             }
             
-            # 粉丝勋章
-            if len(info) > 3 and info[3]:
-                data["medal"] = {
-                    "level": info[3][0],
-                    "name": info[3][1],
-                    "anchor_uname": info[3][2],
-                    "anchor_room_id": info[3][3]
-                }
-            
             # 检测用户首次出现
-            user_uid = data["user"]["uid"]
-            user_name = data["user"]["uname"]
-            
             if user_uid and user_name and user_uid not in self.user_first_seen:
                 # 记录用户首次出现
-                import time
-                self.user_first_seen[user_uid] = {
-                    "name": user_name,
-                    "time": time.time(),
-                    "source": "弹幕"
-                }
+                self._record_first_seen(user_uid, user_name, "弹幕")
                 
                 # 触发用户进入事件
                 await self._trigger_user_enter(user_name, user_uid, "弹幕")
@@ -713,7 +762,7 @@ class DanmakuClient:
             if self.on_danmaku:
                 await self.on_danmaku(data)
         except Exception as e:
-            print(f"处理弹幕错误: {e}")
+            logger.error("处理弹幕错误: %s", e)
     
     async def _handle_gift(self, msg: dict):
         """处理礼物消息"""
@@ -742,12 +791,7 @@ class DanmakuClient:
             
             if user_uid and user_name and user_uid not in self.user_first_seen:
                 # 记录用户首次出现
-                import time
-                self.user_first_seen[user_uid] = {
-                    "name": user_name,
-                    "time": time.time(),
-                    "source": "礼物"
-                }
+                self._record_first_seen(user_uid, user_name, "礼物")
                 
                 # 触发用户进入事件
                 await self._trigger_user_enter(user_name, user_uid, "送礼")
@@ -755,7 +799,7 @@ class DanmakuClient:
             if self.on_gift:
                 await self.on_gift(data)
         except Exception as e:
-            print(f"处理礼物错误: {e}")
+            logger.error("处理礼物错误: %s", e)
     
     async def _handle_superchat(self, msg: dict):
         """处理醒目留言（SC）"""
@@ -782,12 +826,7 @@ class DanmakuClient:
             
             if user_uid and user_name and user_uid not in self.user_first_seen:
                 # 记录用户首次出现
-                import time
-                self.user_first_seen[user_uid] = {
-                    "name": user_name,
-                    "time": time.time(),
-                    "source": "SC"
-                }
+                self._record_first_seen(user_uid, user_name, "SC")
                 
                 # 触发用户进入事件
                 await self._trigger_user_enter(user_name, user_uid, "SC")
@@ -795,7 +834,7 @@ class DanmakuClient:
             if self.on_superchat:
                 await self.on_superchat(data)
         except Exception as e:
-            print(f"处理SC错误: {e}")
+            logger.error("处理SC错误: %s", e)
     
     async def _handle_guard(self, msg: dict):
         """处理上舰消息"""
@@ -825,12 +864,7 @@ class DanmakuClient:
             
             if user_uid and user_name and user_uid not in self.user_first_seen:
                 # 记录用户首次出现
-                import time
-                self.user_first_seen[user_uid] = {
-                    "name": user_name,
-                    "time": time.time(),
-                    "source": "上舰"
-                }
+                self._record_first_seen(user_uid, user_name, "上舰")
                 
                 # 触发用户进入事件
                 await self._trigger_user_enter(user_name, user_uid, "上舰")
@@ -838,7 +872,7 @@ class DanmakuClient:
             if self.on_guard:
                 await self.on_guard(data)
         except Exception as e:
-            print(f"处理上舰错误: {e}")
+            logger.error("处理上舰错误: %s", e)
     
     async def _handle_interact(self, msg: dict):
         """处理用户进入直播间（旧版本）"""
@@ -846,7 +880,8 @@ class DanmakuClient:
             data_info = msg.get("data", {})
             
             # 打印原始数据用于调试
-            print(f"[调试] INTERACT_WORD 原始数据: {data_info}")
+            if _debug_enabled(logging.DEBUG):
+                logger.debug("[调试] INTERACT_WORD 原始数据: %s", data_info)
             
             # 尝试获取更多用户信息
             uid = data_info.get("uid")
@@ -858,9 +893,10 @@ class DanmakuClient:
             
             # 检查msg_type
             msg_type = data_info.get("msg_type", 1)
-            msg_type_name = "进入" if msg_type == 1 else "关注"
             
-            print(f"[调试] 用户{msg_type_name}: uid={uid}, uname={uname}")
+            if _debug_enabled(logging.DEBUG):
+                msg_type_name = "进入" if msg_type == 1 else "关注"
+                logger.debug("[调试] 用户%s: uid=%s, uname=%s", msg_type_name, uid, uname)
             
             data = {
                 "type": "interact",
@@ -875,7 +911,7 @@ class DanmakuClient:
             if self.on_interact:
                 await self.on_interact(data)
         except Exception as e:
-            print(f"处理互动错误: {e}")
+            logger.error("处理互动错误: %s", e)
     
     async def _handle_interact_v2(self, msg: dict):
         """处理用户进入直播间V2（新版本，使用protobuf）"""
@@ -885,13 +921,13 @@ class DanmakuClient:
             # 获取protobuf数据
             pb_data = data_info.get("pb", "")
             if not pb_data:
-                print("[调试] INTERACT_WORD_V2 缺少 pb 数据")
+                logger.debug("[调试] INTERACT_WORD_V2 缺少 pb 数据")
                 return
             
             # 使用新的protobuf解析器
             interact_data = parse_interact_word_v2(pb_data)
             if not interact_data:
-                print("[调试] 解析INTERACT_WORD_V2失败")
+                logger.debug("[调试] 解析INTERACT_WORD_V2失败")
                 return
             
             uid = interact_data.get("uid", 0)
@@ -903,31 +939,24 @@ class DanmakuClient:
             clean_uname = self._clean_username(uname)
             
             # 检查msg_type
-            msg_type_names = {
-                1: "进入",
-                2: "关注",
-                3: "分享",
-                4: "特别关注",
-                5: "互粉",
-                6: "点赞"
-            }
-            msg_type_name = msg_type_names.get(msg_type, f"未知类型({msg_type})")
-            
-            print(f"[调试] 用户{msg_type_name}: uid={uid}, uname={clean_uname}")
+            if _debug_enabled(logging.DEBUG):
+                msg_type_name = _MSG_TYPE_NAMES.get(msg_type)
+                if msg_type_name is None:
+                    msg_type_name = f"未知类型({msg_type})"
+                logger.debug("[调试] 用户%s: uid=%s, uname=%s", msg_type_name, uid, clean_uname)
             
             # 只处理进入事件（msg_type=1）
             if msg_type == 1 and uid and clean_uname:
                 # 检测用户首次出现
                 if uid not in self.user_first_seen:
-                    import time
-                    self.user_first_seen[uid] = {
-                        "name": clean_uname,
-                        "time": time.time(),
-                        "source": "进入事件"
-                    }
+                    self._record_first_seen(uid, clean_uname, "进入事件")
                 
                 # 触发用户进入事件
-                await self._trigger_user_enter(clean_uname, uid, "进入事件")
+                await self._trigger_user_enter(clean_uname, uid, "进入事件", _cleaned=True)
+            
+            # 没有订阅者时不构造事件数据
+            if not self.on_interact:
+                return
             
             # 构造数据
             data = {
@@ -941,11 +970,10 @@ class DanmakuClient:
                 "source": "INTERACT_WORD_V2"
             }
             
-            if self.on_interact:
-                await self.on_interact(data)
+            await self.on_interact(data)
                 
         except Exception as e:
-            print(f"处理互动V2错误: {e}")
+            logger.error("处理互动V2错误: %s", e)
     
     
     
@@ -964,19 +992,48 @@ class DanmakuClient:
             # 我们不需要处理它为用户进入事件
             
             # 如果需要，可以更新在线人数显示
-            print(f"[人气值] WATCHED_CHANGE人气值: {num}")
+            if _debug_enabled(logging.DEBUG):
+                logger.debug("[人气值] WATCHED_CHANGE人气值: %s", num)
             if self.on_online:
-                await self.on_online({"online": num, "source": "watched_change"})
+                # 只记录最新值并唤醒回调任务，接收循环不等待回调完成
+                self._online_latest = num
+                self._online_event.set()
                 
         except Exception as e:
-            print(f"处理人气值变化错误: {e}")
+            logger.error("处理人气值变化错误: %s", e)
+    
+    async def _online_consumer(self):
+        """
+        人气值回调任务：被唤醒后等待合并窗口结束，用最新的人气值回调一次 on_online
+        
+        突发时（如重连后）连续的通知会合并为一次回调
+        """
+        event = self._online_event
+        while self.running:
+            await event.wait()
+            await asyncio.sleep(self.ONLINE_COALESCE_SECONDS)
+            event.clear()
+            
+            num = self._online_latest
+            self._online_latest = None
+            if num is None or not self.on_online:
+                continue
+            
+            try:
+                await self.on_online({"online": num, "source": "watched_change"})
+            except Exception as e:
+                logger.error("处理人气值变化错误: %s", e)
     
     async def _handle_watched_change(self, msg: dict):
         """处理用户关注"""
         try:
             data_info = msg.get("data", {})
             uname = data_info.get("uname", "未知用户")
-            print(f"[弹幕调试] 用户关注: {uname}")
+            if _debug_enabled(logging.DEBUG):
+                logger.debug("[弹幕调试] 用户关注: %s", uname)
+            
+            if not self.on_interact:
+                return
             
             data = {
                 "type": "follow",
@@ -987,10 +1044,9 @@ class DanmakuClient:
                 "timestamp": data_info.get("timestamp", 0)
             }
             
-            if self.on_interact:
-                await self.on_interact(data)
+            await self.on_interact(data)
         except Exception as e:
-            print(f"处理关注错误: {e}")
+            logger.error("处理关注错误: %s", e)
     
     async def _handle_entry_effect(self, msg: dict):
         """处理进入特效（舰长进入）"""
@@ -998,7 +1054,8 @@ class DanmakuClient:
             data_info = msg.get("data", {})
             
             # 打印原始数据用于调试
-            print(f"[调试] ENTRY_EFFECT 原始数据: {data_info}")
+            if _debug_enabled(logging.DEBUG):
+                logger.debug("[调试] ENTRY_EFFECT 原始数据: %s", data_info)
             
             # 获取用户信息
             uid = data_info.get("uid")
@@ -1008,7 +1065,12 @@ class DanmakuClient:
             effect_id = data_info.get("effect_id")
             copy_writing = data_info.get("copy_writing")  # 特效文字
             
-            print(f"[舰长进入] {uname} (UID: {uid}), 特效: {copy_writing}")
+            if _debug_enabled(logging.DEBUG):
+                logger.debug("[舰长进入] %s (UID: %s), 特效: %s", uname, uid, copy_writing)
+            
+            # 进入特效只分发给插件，没有插件订阅时不构造事件数据
+            if not self._interact_plugins:
+                return
             
             # 构造数据
             data = {
@@ -1025,82 +1087,63 @@ class DanmakuClient:
             }
             
             # 调用插件的on_interact方法处理
-            if hasattr(self, 'plugin_manager'):
-                for plugin in self.plugin_manager.plugins.values():
-                    if plugin.enabled and hasattr(plugin, 'on_interact'):
-                        try:
-                            await plugin.on_interact(data)
-                        except Exception as e:
-                            print(f"插件 {plugin.name} 处理进入特效事件失败: {e}")
+            await self._notify_interact_plugins(data, "进入特效")
             
         except Exception as e:
-            print(f"处理进入特效错误: {e}")
+            logger.error("处理进入特效错误: %s", e)
     
-    def _clean_username(self, username: str) -> str:
-        """清理用户名，移除控制字符和URL"""
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _clean_username(username: str) -> str:
+        """清理用户名，移除控制字符和URL（无状态，结果按原始用户名缓存）"""
         if not username:
             return username
         
-        # 移除换行符和其他控制字符
-        cleaned = ''.join(char for char in username if ord(char) >= 32 or char in '\t\n\r')
-        
-        # 移除B站头像URL - 改进的逻辑
-        if 'http' in cleaned and 'bfs/face/' in cleaned:
-            # 查找URL的开始
-            http_start = cleaned.find('http')
-            if http_start != -1:
-                # 查找URL的结束 - 尝试多种图片格式
-                url_end = -1
-                for ext in ['.jpg', '.png', '.jpeg', '.gif', '.webp']:
-                    ext_end = cleaned.find(ext, http_start)
-                    if ext_end != -1:
-                        url_end = ext_end + len(ext)
-                        break
-                
-                if url_end != -1:
-                    # 找到图片扩展名，移除整个URL
-                    before_url = cleaned[:http_start].rstrip()
-                    after_url = cleaned[url_end:].lstrip()
-                    cleaned = before_url + ' ' + after_url if after_url else before_url
-                else:
-                    # 没找到图片扩展名，尝试找到下一个空格或特殊字符
-                    space_end = cleaned.find(' ', http_start)
-                    if space_end != -1:
-                        cleaned = cleaned[:http_start].rstrip() + cleaned[space_end:]
-                    else:
-                        # 如果没有空格，直接移除从http开始的所有内容
-                        cleaned = cleaned[:http_start].rstrip()
-        
-        # 清理多余的空格
-        cleaned = ' '.join(cleaned.split())
-        
-        # 去除首尾空格
-        cleaned = cleaned.strip()
+        # 移除换行符以外的控制字符、B站头像URL，再合并多余的空白
+        cleaned = _CTRL_RE.sub('', username)
+        if 'bfs/face/' in cleaned:
+            cleaned = _BFS_URL_RE.sub(' ', cleaned)
+        cleaned = _WS_RE.sub(' ', cleaned).strip()
         
         # 限制长度（在去除空格后）
         if len(cleaned) > 20:
             cleaned = cleaned[:20].rstrip()
         
-        # 如果清理后为空或只有空格，返回默认值
-        if not cleaned or cleaned.isspace():
-            return "用户"
-        
-        return cleaned
+        # 如果清理后为空，返回默认值
+        return cleaned or "用户"
     
-    async def _trigger_user_enter(self, user_name: str, user_uid: int, source: str):
-        """触发用户进入事件"""
-        # 清理用户名
-        clean_name = self._clean_username(user_name)
+    def _record_first_seen(self, uid: int, name: str, source: str):
+        """记录用户首次出现，超过上限时淘汰最早记录的用户"""
+        if len(self.user_first_seen) >= self.MAX_TRACKED_USERS:
+            self.user_first_seen.popitem(last=False)
+        # 使用元组而不是字典保存，每个用户的内存占用约为原来的四分之一
+        self.user_first_seen[uid] = (name, _now(), source)
+    
+    async def _trigger_user_enter(self, user_name: str, user_uid: int, source: str,
+                                  _cleaned: bool = False):
+        """
+        触发用户进入事件
         
-        # 避免重复触发
-        key = f"{user_uid}:{clean_name}"
-        if key in self.user_enter_history:
+        Args:
+            user_name: 用户名
+            user_uid: 用户 UID
+            source: 进入来源
+            _cleaned: 用户名是否已经清理过（已清理时不再重复清理）
+        """
+        # 避免重复触发：按整数 UID 去重，命中时刷新其 LRU 位置
+        history = self.user_enter_history
+        if user_uid in history:
+            history.move_to_end(user_uid)
             return
         
-        self.user_enter_history.add(key)
+        history[user_uid] = None
+        if len(history) > self.MAX_TRACKED_USERS:
+            history.popitem(last=False)
         
+        # 清理用户名
+        clean_name = user_name if _cleaned else self._clean_username(user_name)
+
         # 构造进入事件数据
-        import time
         enter_data = {
             "type": "interact",
             "msg_type": 1,  # 1-进入
@@ -1108,36 +1151,54 @@ class DanmakuClient:
                 "uid": user_uid,
                 "uname": clean_name
             },
-            "timestamp": time.time(),
+            "timestamp": _now(),
             "source": source  # 进入来源：弹幕、送礼、SC、上舰等
         }
         
-        print(f"[用户进入] {clean_name} (UID: {user_uid}) - 来源: {source}")
+        if _debug_enabled(logging.DEBUG):
+            logger.debug("[用户进入] %s (UID: %s) - 来源: %s", clean_name, user_uid, source)
         
         # 调用插件的on_interact方法
-        if hasattr(self, 'plugin_manager'):
-            for plugin in self.plugin_manager.plugins.values():
-                if plugin.enabled and hasattr(plugin, 'on_interact'):
-                    try:
-                        await plugin.on_interact(enter_data)
-                    except Exception as e:
-                        print(f"插件 {plugin.name} 处理用户进入事件失败: {e}")
+        await self._notify_interact_plugins(enter_data, "用户进入")
+    
+    async def _notify_interact_plugins(self, data: dict, event_name: str):
+        """
+        并发调用所有启用插件的 on_interact，单个插件变慢不会阻塞其他插件
+        
+        Args:
+            data: 事件数据
+            event_name: 事件名称（用于错误输出）
+        """
+        plugins = self._interact_plugins
+        if not plugins:
+            return
+        
+        results = await asyncio.gather(
+            *(plugin.on_interact(data) for plugin in plugins),
+            return_exceptions=True
+        )
+        for plugin, result in zip(plugins, results):
+            if isinstance(result, Exception):
+                logger.error("插件 %s 处理%s事件失败: %s", plugin.name, event_name, result)
     
     def get_user_stats(self) -> Dict:
         """获取用户统计信息"""
-        import time
-        current_time = time.time()
+        current_time = _now()
 
         # 统计最近1小时进入的用户
+        # 记录按首次出现时间排序，从最新的往前扫描，遇到超过1小时的记录即可停止
+        cutoff = current_time - 3600
         recent_users = []
-        for uid, info in self.user_first_seen.items():
-            if current_time - info["time"] < 3600:  # 1小时内
-                recent_users.append({
-                    "uid": uid,
-                    "name": info["name"],
-                    "first_seen": info["time"],
-                    "source": info["source"]
-                })
+        for uid, (name, first_seen, source) in reversed(self.user_first_seen.items()):
+            if first_seen <= cutoff:
+                break
+            recent_users.append({
+                "uid": uid,
+                "name": name,
+                "first_seen": first_seen,
+                "source": source
+            })
+        recent_users.reverse()
 
         return {
             "total_users": len(self.user_first_seen),
@@ -1166,9 +1227,10 @@ class DanmakuClient:
         while self.reconnect_attempts < self.max_reconnect_attempts and not self.running:
             try:
                 self.reconnect_attempts += 1
-                wait_time = min(2 ** self.reconnect_attempts, 60)  # 指数退避，最多60秒
+                # 带随机抖动的指数退避，最多60秒，避免多个实例同时重连
+                wait_time = min(60, random.uniform(1, 2 ** self.reconnect_attempts))
 
-                print(f"尝试重连 ({self.reconnect_attempts}/{self.max_reconnect_attempts}), {wait_time}秒后开始...")
+                print(f"尝试重连 ({self.reconnect_attempts}/{self.max_reconnect_attempts}), {wait_time:.1f}秒后开始...")
 
                 # 等待退避时间
                 await asyncio.sleep(wait_time)
@@ -1193,7 +1255,6 @@ class DanmakuClient:
 
             except Exception as e:
                 print(f"重连过程出错: {e}")
-                import traceback
                 traceback.print_exc()
 
         # 如果所有重连尝试都失败了
@@ -5,7 +5,8 @@
 """
 
 import asyncio
-import time
+import random
+from time import perf_counter_ns
 from typing import Optional, Callable
 
 from core.danmaku import DanmakuClient as OriginalDanmakuClient
@@ -19,6 +20,9 @@ logger = get_logger("danmaku_enhanced")
 class EnhancedDanmakuClient(OriginalDanmakuClient):
     """增强版弹幕客户端"""
     
+    # 处理耗时的抽样间隔（每 N 条消息测量一次，N 为 2 的幂）
+    RECV_SAMPLE_INTERVAL = 32
+    
     def __init__(self, room_id: int, cookies: Optional[dict] = None):
         super().__init__(room_id, cookies)
         
@@ -33,6 +37,9 @@ class EnhancedDanmakuClient(OriginalDanmakuClient):
         self.is_reconnecting = False
         self.reconnect_task = None
         
+        # 消息计数，用于抽样记录处理耗时
+        self._recv_counter = 0
+        
         # 回调函数
         self.on_reconnect_start: Optional[Callable] = None
         self.on_reconnect_success: Optional[Callable] = None
@@ -79,12 +86,15 @@ class EnhancedDanmakuClient(OriginalDanmakuClient):
             
             # 计算延迟时间
             if self.exponential_backoff:
-                delay = min(self.retry_delay * (2 ** (self.retry_count - 1)), 60)
+                delay = self.retry_delay * (2 ** (self.retry_count - 1))
+                # 在 0.5~1.5 倍之间随机抖动，避免多个实例在服务端故障后同时重连
+                # 抖动后再限制上限，保证等待时间不超过 60 秒
+                delay = min(random.uniform(delay * 0.5, delay * 1.5), 60)
             else:
                 delay = self.retry_delay
             
             logger.info(f"第 {self.retry_count}/{self.max_retries} 次重连尝试，"
-                       f"等待 {delay} 秒...")
+                       f"等待 {delay:.1f} 秒...")
             
             await asyncio.sleep(delay)
             
@@ -120,23 +130,23 @@ class EnhancedDanmakuClient(OriginalDanmakuClient):
     
     async def _receive_loop(self):
         """改进的消息接收循环"""
+        sample_interval = self.RECV_SAMPLE_INTERVAL
+        sample_mask = sample_interval - 1
         try:
             while self.running:
                 try:
                     data = await self.ws.recv()
                     
-                    # 记录处理开始时间
-                    start_time = time.time()
-                    
-                    # 将接收到的数据追加到缓冲区
-                    self.buffer.extend(data)
+                    # 每 sample_interval 条消息测量一次处理耗时，计数按抽样间隔补足
+                    self._recv_counter += 1
+                    if self._recv_counter & sample_mask:
+                        await self._handle_packet(data)
+                        continue
                     
-                    # 处理缓冲区中的数据
-                    await self._handle_packet(self.buffer)
-                    
-                    # 记录处理时间
-                    processing_time = time.time() - start_time
-                    performance_monitor.record_danmaku_processing(processing_time)
+                    start_ns = perf_counter_ns()
+                    await self._handle_packet(data)
+                    processing_time = (perf_counter_ns() - start_ns) / 1e9
+                    performance_monitor.record_danmaku_processing(processing_time, sample_interval)
                 
                 except asyncio.CancelledError:
                     logger.info("接收循环被取消")
@@ -160,10 +170,6 @@ class EnhancedDanmakuClient(OriginalDanmakuClient):
         except Exception as e:
             logger.error(f"接收循环错误: {e}", exc_info=True)
             self.running = False
-        
-        finally:
-            # 清理缓冲区
-            self.buffer.clear()
     
     async def disconnect(self):
         """断开连接"""
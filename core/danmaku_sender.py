@@ -7,6 +7,7 @@ B站弹幕发送模块
 import time
 import random
 import asyncio
+from collections import Counter, deque
 from typing import Dict, Optional
 from pathlib import Path
 
@@ -32,8 +33,22 @@ class DanmakuSender:
         self.room_id = room_id
         self.csrf_token = self._get_csrf_token()
         
-        # 发送历史（防止刷屏）
-        self.send_history = []
+        # 请求头只与房间号有关，创建时构造一次，每次发送复用
+        self._headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            "Referer": f"https://live.bilibili.com/{room_id}",
+            "Origin": "https://live.bilibili.com",
+            "Sec-Fetch-Dest": "empty",
+            "Sec-Fetch-Mode": "cors",
+            "Sec-Fetch-Site": "same-site"
+        }
+        
+        # HTTP客户端（连接池），首次发送时创建，之后复用已建立的 TLS 连接
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        # 发送历史（防止刷屏）：按时间顺序的 (消息, 发送时间)，计数器与其保持同步
+        self.send_history: deque = deque()
+        self.send_count: Counter = Counter()
         self.last_send_time = 0
         
         # 默认配置
@@ -50,6 +65,31 @@ class DanmakuSender:
         """
         return self.cookies.get("bili_jct", "")
     
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        获取共享的 HTTP 客户端
+        
+        Returns:
+            httpx.AsyncClient: 客户端实例
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                cookies=self.cookies,
+                http2=True,
+                timeout=10.0,
+                limits=httpx.Limits(max_keepalive_connections=4)
+            )
+        return self._client
+    
+    async def close(self):
+        """关闭 HTTP 客户端"""
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except Exception as e:
+                print(f"关闭HTTP客户端时出错: {e}")
+            self._client = None
+    
     async def send(self, message: str, **kwargs) -> Dict:
         """
         发送弹幕
@@ -97,7 +137,7 @@ class DanmakuSender:
                 "bubble": kwargs.get("bubble", 0),
                 "msg": message,
                 "roomid": self.room_id,
-                "rnd": int(time.time()),
+                "rnd": int(current_time),
                 "color": kwargs.get("color", 16777215),  # 白色
                 "mode": kwargs.get("mode", 1),  # 普通弹幕
                 "fontsize": kwargs.get("fontsize", 25),
@@ -108,46 +148,32 @@ class DanmakuSender:
             # WBI 签名
             params = await sign_params(params)
 
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Referer": f"https://live.bilibili.com/{self.room_id}",
-                "Origin": "https://live.bilibili.com",
-                "Sec-Fetch-Dest": "empty",
-                "Sec-Fetch-Mode": "cors",
-                "Sec-Fetch-Site": "same-site"
-            }
-
-            async with httpx.AsyncClient(cookies=self.cookies) as client:
-                response = await client.post(
-                    self.SEND_URL,
-                    data=params,
-                    headers=headers,
-                    timeout=10.0
-                )
-
-                data = response.json()
+            response = await self._get_client().post(
+                self.SEND_URL,
+                data=params,
+                headers=self._headers
+            )
+            data = response.json()
 
-                if data.get("code") == 0:
-                    # 发送成功，记录历史
-                    self.send_history.append({
-                        "message": message,
-                        "time": current_time
-                    })
-                    self.last_send_time = current_time
+            if data.get("code") == 0:
+                # 发送成功，记录历史
+                self.send_history.append((message, current_time))
+                self.send_count[message] += 1
+                self.last_send_time = current_time
 
-                    # 清理旧的历史记录（保留最近10条）
-                    if len(self.send_history) > 10:
-                        self.send_history = self.send_history[-10:]
+                # 清理旧的历史记录（保留最近10条）
+                while len(self.send_history) > 10:
+                    self._pop_oldest()
 
-                    return {
-                        "success": True,
-                        "message": "发送成功"
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "message": data.get("message", "发送失败")
-                    }
+                return {
+                    "success": True,
+                    "message": "发送成功"
+                }
+            else:
+                return {
+                    "success": False,
+                    "message": data.get("message", "发送失败")
+                }
 
         except Exception as e:
             return {
@@ -165,17 +191,27 @@ class DanmakuSender:
         Returns:
             bool: 是否重复
         """
-        # 清理最近的历史记录（保留5分钟内的）
-        current_time = time.time()
-        self.send_history = [
-            item for item in self.send_history
-            if current_time - item["time"] < 300
-        ]
+        # 未启用重复限制或没有发送记录时无需检查
+        history = self.send_history
+        if self.max_duplicate <= 0 or not history:
+            return False
         
-        # 统计相同消息的数量
-        count = sum(1 for item in self.send_history if item["message"] == message)
+        # 清理最近的历史记录（保留5分钟内的），历史按时间排序，只需从头部弹出
+        current_time = time.time()
+        while history and current_time - history[0][1] >= 300:
+            self._pop_oldest()
         
-        return count >= self.max_duplicate
+        # 相同消息的数量由计数器直接给出
+        return self.send_count[message] >= self.max_duplicate
+    
+    def _pop_oldest(self):
+        """移除最早的一条发送记录并同步计数器"""
+        message, _ = self.send_history.popleft()
+        remaining = self.send_count[message] - 1
+        if remaining:
+            self.send_count[message] = remaining
+        else:
+            del self.send_count[message]
     
     async def send_with_random_delay(self, message: str, min_delay: float = 1.0, 
                                    max_delay: float = 3.0, **kwargs) -> Dict:
@@ -235,6 +271,8 @@ class DanmakuSender:
 
 # 全局发送器实例
 _danmaku_sender: Optional[DanmakuSender] = None
+# 关闭旧发送器的后台任务，保留引用防止任务在完成前被垃圾回收
+_close_tasks: set = set()
 
 
 def init_danmaku_sender(cookies: Dict, room_id: int) -> DanmakuSender:
@@ -249,7 +287,18 @@ def init_danmaku_sender(cookies: Dict, room_id: int) -> DanmakuSender:
         DanmakuSender: 发送器实例
     """
     global _danmaku_sender
+    old_sender = _danmaku_sender
     _danmaku_sender = DanmakuSender(cookies, room_id)
+    
+    # 关闭旧发送器的连接池（在事件循环中调用时）
+    if old_sender is not None and old_sender._client is not None:
+        try:
+            task = asyncio.get_running_loop().create_task(old_sender.close())
+            _close_tasks.add(task)
+            task.add_done_callback(_close_tasks.discard)
+        except RuntimeError:
+            pass
+    
     return _danmaku_sender
 
 
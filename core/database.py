@@ -4,9 +4,11 @@
 提供SQLite数据持久化功能
 """
 
+import atexit
 import sqlite3
 import json
-import shutil
+import threading
+import weakref
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
@@ -16,12 +18,95 @@ from core.logger import get_logger
 
 logger = get_logger("database")
 
+# 每个连接都需要设置的 PRAGMA（journal_mode=WAL 写入数据库文件，只需在初始化时设置一次）
+# WAL 模式下 synchronous=NORMAL 只在检查点时 fsync，读写互不阻塞
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",  # 约 20MB 页缓存
+    "PRAGMA mmap_size=268435456",  # 256MB 内存映射读
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# 批量写入的插入语句（同时作为待写入队列的键）
+SQL_INSERT_DANMAKU = """
+    INSERT INTO danmaku_records 
+    (room_id, user_name, uid, content, medal_name, medal_level, 
+     is_admin, is_vip)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_INSERT_GIFT = """
+    INSERT INTO gift_records 
+    (room_id, user_name, uid, gift_name, gift_id, num, price, total_coin)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_INSERT_METRIC = """
+    INSERT INTO performance_metrics 
+    (metric_name, metric_value, metric_unit)
+    VALUES (?, ?, ?)
+"""
+
+SQL_INSERT_CHECKIN = """
+    INSERT INTO checkin_records 
+    (user_name, uid, checkin_date, continuous_days, total_days)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+SQL_INSERT_LOTTERY = """
+    INSERT INTO lottery_records 
+    (user_name, uid, result, lottery_date)
+    VALUES (?, ?, ?, ?)
+"""
+
+SQL_INSERT_ERROR = """
+    INSERT INTO error_logs 
+    (error_type, error_message, stack_trace, context)
+    VALUES (?, ?, ?, ?)
+"""
+
+# 用户分析数据按用户名插入或更新（更新时保留 uid 和 first_seen）
+SQL_UPSERT_USER_ANALYTICS = """
+    INSERT INTO user_analytics 
+    (user_name, uid, danmaku_count, gift_count, gift_value, 
+     last_seen, first_seen, interests, sentiment_score, activity_level)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_name) DO UPDATE SET
+        danmaku_count = excluded.danmaku_count,
+        gift_count = excluded.gift_count,
+        gift_value = excluded.gift_value,
+        last_seen = excluded.last_seen,
+        interests = excluded.interests,
+        sentiment_score = excluded.sentiment_score,
+        activity_level = excluded.activity_level,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# 每个连接缓存的预编译语句数量（sqlite3 按 SQL 文本缓存，连接持久后可一直复用）
+CACHED_STATEMENTS = 256
+
+
+class _ThreadConnection:
+    """线程持有的持久连接及当前事务嵌套深度（线程退出时随线程局部变量一起释放）"""
+    
+    __slots__ = ("conn", "depth", "__weakref__")
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.depth = 0
+
 
 class Database:
     """数据库管理器"""
     
     _instance = None
     
+    # 弹幕、礼物、性能指标先进入内存队列，由后台线程按间隔或数量合并为一个事务写入
+    FLUSH_INTERVAL_SECONDS = 0.5
+    FLUSH_BATCH_SIZE = 500
+    
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
@@ -31,26 +116,147 @@ class Database:
         if not hasattr(self, 'initialized'):
             self.db_path = Path(db_path)
             self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # 每个线程复用一个持久连接，避免每次操作都重新打开数据库和设置 PRAGMA
+            self._local = threading.local()
+            self._connections: set = set()
+            self._connections_lock = threading.Lock()
+            atexit.register(self.close)
+            
+            # 待写入的行 {插入语句: [参数元组]}
+            self._pending: Dict[str, List[tuple]] = {}
+            self._pending_count = 0
+            self._pending_lock = threading.Lock()
+            self._flush_lock = threading.Lock()
+            self._flush_event = threading.Event()
+            
             self.initialized = True
             self._init_database()
+            
+            self._flush_thread = threading.Thread(target=self._flusher, name="db-flusher", daemon=True)
+            self._flush_thread.start()
+            # 在 close 之前执行（atexit 按注册的逆序调用）
+            atexit.register(self.flush)
+    
+    def _thread_connection(self) -> _ThreadConnection:
+        """获取当前线程的持久连接，首次使用时创建"""
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            # 使用默认的隐式事务：第一条写语句之前才开始事务，
+            # 读语句不会先占用读事务，避免之后升级为写事务时与其他写入者冲突
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=CACHED_STATEMENTS
+            )
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            holder = _ThreadConnection(conn)
+            self._local.holder = holder
+            with self._connections_lock:
+                self._connections.add(conn)
+            # 线程退出后线程局部变量被释放，此时关闭连接并停止跟踪
+            weakref.finalize(holder, self._release_connection, conn)
+        return holder
+    
+    def _connection(self) -> sqlite3.Connection:
+        """获取当前线程的持久连接"""
+        return self._thread_connection().conn
+    
+    def _release_connection(self, conn: sqlite3.Connection):
+        """关闭连接并从跟踪集合中移除"""
+        with self._connections_lock:
+            self._connections.discard(conn)
+        try:
+            conn.close()
+        except Exception as e:
+            logger.error(f"关闭数据库连接失败: {e}")
     
     @contextmanager
     def get_connection(self):
-        """获取数据库连接（上下文管理器）"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """
+        获取数据库连接（上下文管理器），代码块结束时提交，出错时回滚
+        
+        同一线程内嵌套使用时，内层加入外层的事务，由最外层提交或回滚
+        """
+        holder = self._thread_connection()
+        conn = holder.conn
+        holder.depth += 1
         try:
             yield conn
-            conn.commit()
+            if holder.depth == 1:
+                conn.commit()
         except Exception as e:
-            conn.rollback()
-            logger.error(f"数据库操作失败: {e}")
+            if holder.depth == 1:
+                conn.rollback()
+                logger.error(f"数据库操作失败: {e}")
             raise
         finally:
-            conn.close()
+            holder.depth -= 1
+    
+    def _enqueue(self, sql: str, row: tuple):
+        """
+        将一行数据加入待写入队列
+        
+        Args:
+            sql: 插入语句
+            row: 参数元组
+        """
+        with self._pending_lock:
+            rows = self._pending.get(sql)
+            if rows is None:
+                rows = self._pending[sql] = []
+            rows.append(row)
+            self._pending_count += 1
+            full = self._pending_count >= self.FLUSH_BATCH_SIZE
+        if full:
+            self._flush_event.set()
+    
+    def _flusher(self):
+        """后台写入线程：定期或队列积满时写入待写入的行"""
+        while True:
+            self._flush_event.wait(self.FLUSH_INTERVAL_SECONDS)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception:
+                # 错误已在 flush 中记录，继续处理后续数据
+                pass
+    
+    def flush(self):
+        """立即在一个事务中写入所有待写入的行"""
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending_count:
+                    return
+                pending, self._pending = self._pending, {}
+                count, self._pending_count = self._pending_count, 0
+            
+            try:
+                with self.get_connection() as conn:
+                    for sql, rows in pending.items():
+                        conn.executemany(sql, rows)
+            except Exception as e:
+                logger.error(f"批量写入失败，丢弃 {count} 行: {e}")
+                raise
+    
+    def close(self):
+        """关闭所有线程的持久连接（进程退出时自动调用）"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.error(f"关闭数据库连接失败: {e}")
+        # 当前线程之后再使用时重新创建连接
+        self._local = threading.local()
     
     def _init_database(self):
         """初始化数据库表"""
+        # WAL 模式持久保存在数据库文件中，之后的连接都会使用（不能在事务中切换）
+        self._connection().execute("PRAGMA journal_mode=WAL")
+        
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
@@ -73,11 +279,23 @@ class Database:
                 )
             """)
             
-            # 创建索引
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_user_name 
-                ON user_analytics(user_name)
-            """)
+            # 用户名唯一索引（UPSERT 依赖），替换旧的普通索引
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_user_analytics_name'"
+            )
+            if cursor.fetchone() is None:
+                # 旧数据库可能存在同名的重复记录，只保留最新的一条
+                cursor.execute("""
+                    DELETE FROM user_analytics 
+                    WHERE id NOT IN (SELECT MAX(id) FROM user_analytics GROUP BY user_name)
+                """)
+                if cursor.rowcount:
+                    logger.info(f"清理了 {cursor.rowcount} 条重复的用户分析记录")
+                cursor.execute("""
+                    CREATE UNIQUE INDEX ux_user_analytics_name 
+                    ON user_analytics(user_name)
+                """)
+                cursor.execute("DROP INDEX IF EXISTS idx_user_name")
             
             # 弹幕记录表
             cursor.execute("""
@@ -101,10 +319,13 @@ class Database:
                 ON danmaku_records(timestamp)
             """)
             
+            # 按房间查询最近弹幕：复合索引可直接按时间倒序扫描，无需排序
+            # （同时覆盖只按 room_id 过滤的查询，替代旧的单列索引）
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_danmaku_room 
-                ON danmaku_records(room_id)
+                CREATE INDEX IF NOT EXISTS idx_danmaku_room_ts 
+                ON danmaku_records(room_id, timestamp DESC)
             """)
+            cursor.execute("DROP INDEX IF EXISTS idx_danmaku_room")
             
             # 礼物记录表
             cursor.execute("""
@@ -122,6 +343,11 @@ class Database:
                 )
             """)
             
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_gift_ts 
+                ON gift_records(timestamp)
+            """)
+            
             # 签到记录表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS checkin_records (
@@ -159,6 +385,11 @@ class Database:
                 )
             """)
             
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_metrics_name_ts 
+                ON performance_metrics(metric_name, timestamp DESC)
+            """)
+            
             # 错误日志表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS error_logs (
@@ -171,64 +402,30 @@ class Database:
                 )
             """)
             
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_errors_ts 
+                ON error_logs(timestamp DESC)
+            """)
+            
             logger.info("数据库初始化完成")
     
     # ==================== 用户分析相关 ====================
     
     def save_user_analytics(self, user_data: Dict):
-        """保存用户分析数据"""
+        """保存用户分析数据（不存在则插入，存在则更新）"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # 检查用户是否存在
-            cursor.execute(
-                "SELECT id FROM user_analytics WHERE user_name = ?",
-                (user_data['user_name'],)
-            )
-            existing = cursor.fetchone()
-            
-            if existing:
-                # 更新现有记录
-                cursor.execute("""
-                    UPDATE user_analytics 
-                    SET danmaku_count = ?,
-                        gift_count = ?,
-                        gift_value = ?,
-                        last_seen = ?,
-                        interests = ?,
-                        sentiment_score = ?,
-                        activity_level = ?,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE user_name = ?
-                """, (
-                    user_data.get('danmaku_count', 0),
-                    user_data.get('gift_count', 0),
-                    user_data.get('gift_value', 0),
-                    user_data.get('last_seen'),
-                    json.dumps(user_data.get('interests', []), ensure_ascii=False),
-                    user_data.get('sentiment_score', 0),
-                    user_data.get('activity_level', 'low'),
-                    user_data['user_name']
-                ))
-            else:
-                # 插入新记录
-                cursor.execute("""
-                    INSERT INTO user_analytics 
-                    (user_name, uid, danmaku_count, gift_count, gift_value, 
-                     last_seen, first_seen, interests, sentiment_score, activity_level)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    user_data['user_name'],
-                    user_data.get('uid'),
-                    user_data.get('danmaku_count', 0),
-                    user_data.get('gift_count', 0),
-                    user_data.get('gift_value', 0),
-                    user_data.get('last_seen'),
-                    user_data.get('first_seen'),
-                    json.dumps(user_data.get('interests', []), ensure_ascii=False),
-                    user_data.get('sentiment_score', 0),
-                    user_data.get('activity_level', 'low')
-                ))
+            conn.execute(SQL_UPSERT_USER_ANALYTICS, (
+                user_data['user_name'],
+                user_data.get('uid'),
+                user_data.get('danmaku_count', 0),
+                user_data.get('gift_count', 0),
+                user_data.get('gift_value', 0),
+                user_data.get('last_seen'),
+                user_data.get('first_seen'),
+                json.dumps(user_data.get('interests', []), ensure_ascii=False),
+                user_data.get('sentiment_score', 0),
+                user_data.get('activity_level', 'low')
+            ))
     
     def get_user_analytics(self, user_name: str) -> Optional[Dict]:
         """获取用户分析数据"""
@@ -269,28 +466,24 @@ class Database:
     # ==================== 弹幕记录相关 ====================
     
     def save_danmaku(self, danmaku_data: Dict):
-        """保存弹幕记录"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO danmaku_records 
-                (room_id, user_name, uid, content, medal_name, medal_level, 
-                 is_admin, is_vip)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                danmaku_data.get('room_id'),
-                danmaku_data['user']['uname'],
-                danmaku_data['user'].get('uid'),
-                danmaku_data['content'],
-                danmaku_data.get('medal', {}).get('name') if danmaku_data.get('medal') else None,
-                danmaku_data.get('medal', {}).get('level') if danmaku_data.get('medal') else None,
-                danmaku_data['user'].get('is_admin', False),
-                danmaku_data['user'].get('is_vip', False)
-            ))
+        """保存弹幕记录（加入批量写入队列）"""
+        user = danmaku_data['user']
+        medal = danmaku_data.get('medal')
+        self._enqueue(SQL_INSERT_DANMAKU, (
+            danmaku_data.get('room_id'),
+            user['uname'],
+            user.get('uid'),
+            danmaku_data['content'],
+            medal.get('name') if medal else None,
+            medal.get('level') if medal else None,
+            user.get('is_admin', False),
+            user.get('is_vip', False)
+        ))
     
     def get_recent_danmaku(self, room_id: Optional[int] = None, 
                           limit: int = 100) -> List[Dict]:
         """获取最近的弹幕记录"""
+        self.flush()
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
@@ -313,23 +506,18 @@ class Database:
     # ==================== 礼物记录相关 ====================
     
     def save_gift(self, gift_data: Dict):
-        """保存礼物记录"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO gift_records 
-                (room_id, user_name, uid, gift_name, gift_id, num, price, total_coin)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                gift_data.get('room_id'),
-                gift_data['user']['uname'],
-                gift_data['user'].get('uid'),
-                gift_data['gift_name'],
-                gift_data.get('gift_id'),
-                gift_data.get('num', 1),
-                gift_data.get('price', 0),
-                gift_data.get('total_coin', 0)
-            ))
+        """保存礼物记录（加入批量写入队列）"""
+        user = gift_data['user']
+        self._enqueue(SQL_INSERT_GIFT, (
+            gift_data.get('room_id'),
+            user['uname'],
+            user.get('uid'),
+            gift_data['gift_name'],
+            gift_data.get('gift_id'),
+            gift_data.get('num', 1),
+            gift_data.get('price', 0),
+            gift_data.get('total_coin', 0)
+        ))
     
     # ==================== 签到抽签相关 ====================
     
@@ -371,11 +559,10 @@ class Database:
                     continuous_days = last_checkin['continuous_days'] + 1
             
             # 插入新签到记录
-            cursor.execute("""
-                INSERT INTO checkin_records 
-                (user_name, uid, checkin_date, continuous_days, total_days)
-                VALUES (?, ?, ?, ?, ?)
-            """, (user_name, uid, today, continuous_days, total_days))
+            cursor.execute(
+                SQL_INSERT_CHECKIN,
+                (user_name, uid, today, continuous_days, total_days)
+            )
             
             return {
                 "success": True,
@@ -389,29 +576,20 @@ class Database:
         
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO lottery_records 
-                (user_name, uid, result, lottery_date)
-                VALUES (?, ?, ?, ?)
-            """, (user_name, uid, result, today))
+            cursor.execute(SQL_INSERT_LOTTERY, (user_name, uid, result, today))
     
     # ==================== 性能监控相关 ====================
     
     def save_metric(self, metric_name: str, metric_value: float, 
                    metric_unit: str = ""):
-        """保存性能指标"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO performance_metrics 
-                (metric_name, metric_value, metric_unit)
-                VALUES (?, ?, ?)
-            """, (metric_name, metric_value, metric_unit))
+        """保存性能指标（加入批量写入队列）"""
+        self._enqueue(SQL_INSERT_METRIC, (metric_name, metric_value, metric_unit))
     
     def get_metrics(self, metric_name: str, hours: int = 24) -> List[Dict]:
         """获取性能指标"""
         since = datetime.now() - timedelta(hours=hours)
         
+        self.flush()
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -429,11 +607,10 @@ class Database:
         """保存错误日志"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO error_logs 
+            cursor.execute(
+                SQL_INSERT_ERROR,
                 (error_type, error_message, stack_trace, context)
-                VALUES (?, ?, ?, ?)
-            """, (error_type, error_message, stack_trace, context))
+            )
     
     def get_recent_errors(self, limit: int = 100) -> List[Dict]:
         """获取最近的错误日志"""
@@ -453,6 +630,7 @@ class Database:
         """清理旧数据"""
         cutoff_date = datetime.now() - timedelta(days=days)
         
+        self.flush()
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
@@ -498,7 +676,14 @@ class Database:
         backup_file = backup_path / f"database_backup_{timestamp}.db"
         
         try:
-            shutil.copy2(self.db_path, backup_file)
+            self.flush()
+            
+            # WAL 模式下部分数据可能仍在 -wal 文件中，使用 SQLite 在线备份而不是直接复制文件
+            target = sqlite3.connect(backup_file)
+            try:
+                self._connection().backup(target)
+            finally:
+                target.close()
             logger.info(f"数据库备份成功: {backup_file}")
             
             # 清理旧备份（保留最近10个）
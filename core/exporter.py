@@ -206,13 +206,12 @@ class DataExporter:
         """
         filepath = self.export_dir / filename
         
-        if not filepath.exists():
-            return False
-        
         try:
             filepath.unlink()
             logger.info(f"删除导出文件: {filename}")
             return True
+        except FileNotFoundError:
+            return False
         except Exception as e:
             logger.error(f"删除导出文件失败: {e}", exc_info=True)
             return False
@@ -4,18 +4,35 @@
 提供统一的日志管理功能
 """
 
+import atexit
 import logging
+import queue
 import sys
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime
 
 
+class _RoutingHandler(logging.Handler):
+    """队列监听线程中的分发处理器，按记录器名称转交给各自的文件和控制台处理器"""
+    
+    def __init__(self, handlers: dict):
+        super().__init__()
+        self._handlers = handlers
+    
+    def handle(self, record: logging.LogRecord):
+        for handler in self._handlers.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+
 class LoggerManager:
     """日志管理器"""
     
     _instance = None
     _loggers = {}
+    _handlers = {}
     
     def __new__(cls):
         if cls._instance is None:
@@ -26,6 +43,12 @@ class LoggerManager:
         if not hasattr(self, 'initialized'):
             self.log_dir = Path("./logs")
             self.log_dir.mkdir(parents=True, exist_ok=True)
+            
+            # 所有记录器共用一个队列和一个监听线程，避免文件和控制台 I/O 阻塞事件循环
+            self._queue = queue.SimpleQueue()
+            self._listener = QueueListener(self._queue, _RoutingHandler(self._handlers))
+            self._listener.start()
+            atexit.register(self._listener.stop)
             self.initialized = True
     
     def get_logger(self, name: str, level: int = logging.INFO) -> logging.Logger:
@@ -71,8 +94,9 @@ class LoggerManager:
         file_handler.setFormatter(formatter)
         console_handler.setFormatter(formatter)
         
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+        # 先登记处理器再挂上队列处理器，保证监听线程取到记录时能找到目标
+        self._handlers[name] = (file_handler, console_handler)
+        logger.addHandler(QueueHandler(self._queue))
         
         self._loggers[name] = logger
         return logger
@@ -81,7 +105,7 @@ class LoggerManager:
         """设置日志级别"""
         if name in self._loggers:
             self._loggers[name].setLevel(level)
-            for handler in self._loggers[name].handlers:
+            for handler in self._handlers[name]:
                 handler.setLevel(level)
 
 
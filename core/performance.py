@@ -106,10 +106,16 @@ class PerformanceMonitor:
         except Exception as e:
             logger.error(f"收集性能指标失败: {e}")
     
-    def record_danmaku_processing(self, processing_time: float):
-        """记录弹幕处理时间"""
+    def record_danmaku_processing(self, processing_time: float, count: int = 1):
+        """
+        记录弹幕处理时间
+        
+        Args:
+            processing_time: 单条消息的处理时间（秒）
+            count: 本次记录代表的消息数（抽样记录时为抽样间隔）
+        """
         self.metrics['danmaku_processing_time'].append(processing_time)
-        self.metrics['danmaku_count'] += 1
+        self.metrics['danmaku_count'] += count
     
     def record_plugin_execution(self, plugin_name: str, execution_time: float):
         """记录插件执行时间"""
@@ -9,8 +9,9 @@ import json
 import importlib
 import importlib.util
 import asyncio
+import weakref
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from pathlib import Path
 
 
@@ -188,6 +189,9 @@ class PluginManager:
         self.plugins: Dict[str, PluginBase] = {}
         self.plugin_states: Dict[str, bool] = {}  # 插件启用状态
         
+        # 插件加载/启用/禁用时通知的回调（弱引用，不阻止订阅者被回收）
+        self._change_listeners: List[weakref.WeakMethod] = []
+        
         # 加载插件状态
         self._load_plugin_states()
     
@@ -212,6 +216,44 @@ class PluginManager:
         except Exception as e:
             print(f"保存插件状态失败: {e}")
     
+    def add_change_listener(self, callback: Callable[[], None]):
+        """
+        注册插件变更回调，插件加载、重载、启用或禁用后调用
+        
+        Args:
+            callback: 无参数的绑定方法（以弱引用保存）
+        """
+        self._change_listeners.append(weakref.WeakMethod(callback))
+    
+    def _notify_change(self):
+        """通知所有订阅者插件列表或启用状态已变化，并清理已回收的订阅者"""
+        alive = []
+        for ref in self._change_listeners:
+            callback = ref()
+            if callback is None:
+                continue
+            alive.append(ref)
+            try:
+                callback()
+            except Exception as e:
+                print(f"插件变更回调执行失败: {e}")
+        self._change_listeners = alive
+    
+    def get_enabled_plugins(self, method_name: str) -> tuple:
+        """
+        获取实现了指定事件方法的已启用插件
+        
+        Args:
+            method_name: 事件方法名（如 on_interact）
+            
+        Returns:
+            tuple: 插件实例元组
+        """
+        return tuple(
+            plugin for plugin in self.plugins.values()
+            if plugin.enabled and hasattr(plugin, method_name)
+        )
+    
     def discover_plugins(self) -> List[str]:
         """
         发现所有插件
@@ -286,6 +328,7 @@ class PluginManager:
                 plugin_instance.enabled = self.plugin_states[plugin_instance.name]
 
             self.plugins[plugin_instance.name] = plugin_instance
+            self._notify_change()
 
             # 调用初始化钩子
             try:
@@ -377,6 +420,7 @@ class PluginManager:
             plugin.enabled = enabled
             self.plugin_states[plugin_name] = enabled
             self._save_plugin_states()
+            self._notify_change()
 
             # 调用生命周期钩子
             try:
@@ -480,6 +524,7 @@ class PluginManager:
         # 移除旧插件
         if plugin_name in self.plugins:
             del self.plugins[plugin_name]
+            self._notify_change()
         
         # 重新加载
         return self.load_plugin(plugin_file_name)
@@ -12,6 +12,7 @@ from typing import Optional, Dict, List, Callable
 import httpx
 
 from core.auth import BilibiliAuth
+from core.danmaku import install_uvloop
 
 
 class ImprovedDanmakuClient:
@@ -269,4 +270,5 @@ async def example_usage():
 
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(example_usage())
\ No newline at end of file
@@ -129,7 +129,8 @@ async def poll_qrcode(request: QRCodePollRequest):
 @app.post("/api/auth/anonymous")
 async def set_anonymous():
     """切换到匿名模式"""
-    auth_manager.set_anonymous()
+    # 切换模式会加密并写入凭证文件，整体放到线程中执行
+    await asyncio.to_thread(auth_manager.set_anonymous)
     return JSONResponse(content={"success": True, "message": "已切换到匿名模式"})
 
 @app.post("/api/auth/logout")
@@ -790,6 +791,9 @@ async def shutdown_event():
             pass
     manager.active_connections.clear()
 
+    # 关闭认证模块的 HTTP 客户端
+    await auth_manager.close()
+
     logger.info("资源清理完成")
 
 
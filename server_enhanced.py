@@ -5,6 +5,7 @@
 """
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from core.logger import get_logger
@@ -22,6 +23,11 @@ async def startup_tasks():
     logger.info("BililiveRobot 增强版启动")
     logger.info("=" * 60)
     
+    # 0. 扩大默认线程池容量，数据库和导出等阻塞操作经 asyncio.to_thread 在其中执行
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=100, thread_name_prefix="blocking")
+    )
+    
     # 1. 加载配置
     logger.info("加载配置...")
     logger.info(f"服务器地址: {get_config('server.host')}:{get_config('server.port')}")
@@ -112,6 +118,13 @@ async def cache_cleanup_task():
 if __name__ == "__main__":
     import uvicorn
     from server import app
+    from api_extended import unhandled_exception_handler, V2GZipMiddleware
+    
+    # 统一处理未捕获的异常
+    app.add_exception_handler(Exception, unhandled_exception_handler)
+    
+    # 压缩 v2 API 的JSON响应
+    app.add_middleware(V2GZipMiddleware, minimum_size=1024, compresslevel=5)
     
     # 添加启动和关闭事件处理
     @app.on_event("startup")
@@ -122,11 +135,12 @@ if __name__ == "__main__":
     async def on_shutdown():
         await shutdown_tasks()
     
-    # 启动服务器
+    # 启动服务器（已安装 uvloop/httptools 时 uvicorn 会自动选用，Windows 上回退到 asyncio）
     uvicorn.run(
         app,
         host=get_config('server.host', '127.0.0.1'),
         port=get_config('server.port', 8000),
         reload=get_config('server.reload', False),
-        log_level=get_config('server.log_level', 'info')
+        log_level=get_config('server.log_level', 'info'),
+        access_log=get_config('server.access_log', True)
     )